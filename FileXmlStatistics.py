@@ -6,6 +6,9 @@ import gc
 import pprint
 import multiprocessing as mp
 import threading as td
+import evtx
+from sketch import ApproxCounter, count
+from window import windows, xml_events
 import xlwings as xw
 from xlwings import Range, constants
 try:
@@ -41,26 +44,24 @@ class LogXml(Log):
 		for res in self.root.iter(xmlns+tag):
 			print("{} {}: {}".format(self.name, tag, res.text))
 	
-	def statistics(self, tag):
+	def statistics(self, tag, approx=None):
+		# approx: an empty ApproxCounter to keep only the heavy hitters
 		for elem in self.root:
 			xmlns = elem.tag.split("}")[0] + "}"
-		dic = {}
+		dic = approx if approx is not None else {}
 		if tag == "Execution":
 			for res in self.root.iter(xmlns+tag):
-				tmpDic = {res.attrib['ProcessID'] : 1}
-				if res.attrib['ProcessID'] in dic:
-					dic[res.attrib['ProcessID']] +=1
-				else:
-					dic.update(tmpDic)
+				count(dic, res.attrib['ProcessID'])
 				#print(res.attrib['ProcessID'])
 		else:
 			for res in self.root.iter(xmlns+tag):
-				tmpDic = {res.text : 1}
-				if res.text in dic:
-					dic[res.text] +=1
-				else:
-					dic.update(tmpDic)
+				count(dic, res.text)
 		return dic
+
+	def windowed_statistics(self, tag, size, step=None):
+		# (start, end, counts) per window of TimeCreated, the counts dict is
+		# updated in place and only valid until the next window
+		return windows(xml_events(self.root, tag), size, step)
 		
 	def show_tree(self):
 		print("{}.{} Tree Structure".format(self.name, self.type))
@@ -90,6 +91,18 @@ class LogXml(Log):
 		dfs(first_event, 1)
 		print(elem_str(first_event, 0)[1])
 
+class LogEvtx(LogXml):
+	def __init__(self, name, path):
+		super().__init__(name, path)
+		self.type = "evtx"
+
+	def load(self):
+		# same compact tree as the xml export, read from the binary log
+		self.root = evtx.build_tree(self.records())
+
+	def records(self):
+		return evtx.iter_records(self.path)
+
 '''class LogJson(Log):
 	def __init__(self, name, path):
 		super().__init__()
@@ -130,6 +143,17 @@ class TestCase:
 		else:
 			print("Unknown xml file name...")
 
+	def load_evtx(self, file_name):
+		if file_name == "Security.evtx":
+			log = LogEvtx("Security", join(self.path, file_name))
+			self.security_log = log
+
+		elif file_name == "Sysmon.evtx":
+			log = LogEvtx("Sysmon", join(self.path, file_name))
+			self.sysmon_log = log
+		else:
+			print("Unknown evtx file name...")
+
 	'''def load_json(self, file_name):
 		if file_name == "Wireshark.json":
 			log = LogJson("Wireshark", join(self.path, file_name))
@@ -146,6 +170,8 @@ class DataLoader:
 	def check_ext(self, file_name, testcase):
 		if file_name.endswith("xml"):
 			testcase.load_xml(file_name)
+		elif file_name.endswith("evtx"):
+			testcase.load_evtx(file_name)
 		'''elif file_name.endswith("json"):
 			testcase.load_json(file_name)
 		else:
@@ -178,48 +204,40 @@ class DataLoader:
 		return testcase
 
 	def __iter__(self):
-		for testcase in listdir(self.path):
-			yield self.load_testcase(testcase)
+		for testcase in sorted(listdir(self.path)):
+			if isdir(join(self.path, testcase)):
+				yield self.load_testcase(testcase)
 	 
-def mergeDict(dict1, dict2, length):
-	dict3 = {**dict2, **dict1}
-	for key, value in dict3.items():
-		if key in dict1 and key in dict2:
-			value = [value] if not isinstance(value, list) else value
-			value2 = dict2[key]
-			value2 = [value2] if not isinstance(value2, list) else value2
-			dict3[key] = value + value2
-		elif key in dict1 and key not in dict2:
-			value = [value] if not isinstance(value, list) else value
-			dict3[key] = value + [0]
-		elif key not in dict1 and key in dict2:
-			value2 = dict2[key]
-			value2 = [value2] if not isinstance(value2, list) else value2
-			tmpList = [0]*length
-			dict3[key] = tmpList + value2
-			
-	return dict3
-
-def fillSheet(sheetName, tag, dic):
+def mergeDict(dict1, dict2, person):
+	# sparse value -> {person: count} table, persons without the value are not stored
+	for key, value in dict2.items():
+		if key not in dict1:
+			dict1[key] = {}
+		dict1[key][person] = dict1[key].get(person, 0) + value
+	return dict1
+
+def fillSheet(sheetName, tag, dic, class_num):
 	sheet = workbook.sheets[sheetName]
 	empty = sheet.range('A' + str(sheet.cells.last_cell.row)).end('up').row+1
 	if tag == "Execution":
-		sheet.cells(empty, 'A').value = "ProcessID"
+		header = ["ProcessID"]
 	else:
-		sheet.cells(empty, 'A').value = tag
-	for i in range(2, 8):
-		sheet.cells(empty, i).value = "Person"+str(i-1)
+		header = [tag]
+	header += ["Person"+str(i) for i in range(1, class_num+1)] + ["Total"]
+	sheet.range((empty, 1)).value = header
 	empty += 1
 	for key in dic:
-		sheet.cells(empty, 1).value = key
-		for i in range(6):
-			sheet.cells(empty, i+2).value = dic[key][i]
+		row = [key] + [dic[key].get(i, 0) for i in range(1, class_num+1)]
+		sheet.range((empty, 1)).value = row + [sum(dic[key].values())]
 		empty += 1
 if __name__ == "__main__":
 
 	parser = ArgumentParser()
 	parser.add_argument("file_path", help="root path of data")
 	parser.add_argument("tag", help="tag of xml")
+	parser.add_argument("--approx-k", type=int, help="keep only the top k values of each log")
+	parser.add_argument("--epsilon", type=float, default=0.001, help="count error bound, share of all events")
+	parser.add_argument("--delta", type=float, default=0.01, help="probability of exceeding --epsilon")
 	args = parser.parse_args()
 
 	dataLoader = DataLoader(args.file_path)
@@ -231,17 +249,22 @@ if __name__ == "__main__":
 		workbook.sheets.add('Security')
 	securityDic = {}
 	sysmonDic = {}
+	class_num = 0
 	for num, testcase in enumerate(dataLoader):
 		print("testcase {}: {}".format(num+1, testcase.name))
+		class_num = num+1
 		#testcase.wireshark_log.show("frame.time")
-		dict2 = testcase.sysmon_log.statistics(args.tag)
-		dict3 = mergeDict(sysmonDic, dict2, num)
-		sysmonDic = dict3
+		approx = None
+		if args.approx_k:
+			approx = ApproxCounter(args.approx_k, args.epsilon, args.delta)
+		dict2 = testcase.sysmon_log.statistics(args.tag, approx)
+		mergeDict(sysmonDic, dict2, num+1)
 		#print("sysmonDic: {}".format(sysmonDic))
-		dict2 = testcase.security_log.statistics(args.tag)
-		dict3 = mergeDict(securityDic, dict2, num)
-		securityDic = dict3
+		if args.approx_k:
+			approx = ApproxCounter(args.approx_k, args.epsilon, args.delta)
+		dict2 = testcase.security_log.statistics(args.tag, approx)
+		mergeDict(securityDic, dict2, num+1)
 		#print("securityDic: {}".format(securityDic))
-	fillSheet('Sysmon', args.tag, sysmonDic)
-	fillSheet('Security', args.tag, securityDic)
+	fillSheet('Sysmon', args.tag, sysmonDic, class_num)
+	fillSheet('Security', args.tag, securityDic, class_num)
 	
\ No newline at end of file
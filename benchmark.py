@@ -0,0 +1,147 @@
+from argparse import ArgumentParser, Namespace
+from os import listdir, remove
+from os.path import abspath, dirname, isdir, isfile, join
+from datetime import datetime, timezone
+import subprocess
+import json
+import time
+import gc
+from predict import (DataLoader, WiresharkPredictor, SecurityPredictor, SysmonPredictor,
+		Ensemble, lazy_predict)
+from model import open_model
+from features import cache_path, capture_features
+from train import read_labels, train
+
+# Times the pipeline stages over a dataset (e.g. one from gen_dataset.py) and
+# appends one json line per run, so runs of different commits can be compared:
+#   python gen_dataset.py bench_data --size 10MB
+#   python benchmark.py bench_data -o benchmark.jsonl
+# Predictions use the deterministic tie break, so accuracy must not move
+# between runs of the same commit.
+
+STAGES = ["LogXml.load", "capture_features", "extract_features", "predict.Wireshark",
+		"predict.Security", "predict.Sysmon", "pipeline", "pipeline.cached"]
+
+def commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+				text=True, check=True, cwd=dirname(abspath(__file__))).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def timed(timings, stage, func):
+	gc.collect()
+	start = time.perf_counter()
+	res = func()
+	timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+	return res
+
+def load_predictors(tables):
+	wireshark_predictor = WiresharkPredictor()
+	wireshark_predictor.load_model(open_model(join(tables, 'field_value_dict'),
+			join(tables, 'field_value_dict.bin')))
+	security_predictor = SecurityPredictor()
+	security_predictor.load_csv(join(tables, 'Security.csv'))
+	sysmon_predictor = SysmonPredictor()
+	sysmon_predictor.load_csv(join(tables, 'Sysmon.csv'))
+	return wireshark_predictor, security_predictor, sysmon_predictor
+
+def pipeline(testcase, predictors, workers):
+	wireshark_predictor, security_predictor, sysmon_predictor = predictors
+	ensemble = Ensemble()
+	ensemble.add("Wireshark", lazy_predict(testcase.wireshark_log, wireshark_predictor, workers), cost=10)
+	ensemble.add("Security", lazy_predict(testcase.security_log, security_predictor))
+	ensemble.add("Sysmon", lazy_predict(testcase.sysmon_log, sysmon_predictor))
+	return ensemble.vote()
+
+def run_once(data_root, predictors, workers):
+	wireshark_predictor, security_predictor, sysmon_predictor = predictors
+	timings = {}
+	answers = {}
+	for testcase in DataLoader(data_root):
+		for log, predictor in ((testcase.security_log, security_predictor),
+				(testcase.sysmon_log, sysmon_predictor)):
+			if log is None or log.type != "xml":
+				continue
+			timed(timings, "LogXml.load", log.load)
+			timed(timings, "predict." + log.name, lambda: predictor.predict_conf(log.root))
+			log.root = None
+
+		# the path lazy_predict takes, without the feature cache
+		log = testcase.wireshark_log
+		if log is not None and log.type in ("json", "pcap"):
+			features = timed(timings, "capture_features", lambda: capture_features(log.path, workers, cache=False))
+			fields = timed(timings, "extract_features", lambda: wireshark_predictor.extract_features(features))
+			timed(timings, "predict.Wireshark", lambda: wireshark_predictor.predict_fields(fields))
+			features = None
+		if log is not None and isfile(cache_path(log.path)):
+			remove(cache_path(log.path))
+
+		answers[testcase.name] = timed(timings, "pipeline", lambda: pipeline(testcase, predictors, workers))
+		timed(timings, "pipeline.cached", lambda: pipeline(testcase, predictors, workers))
+	return timings, answers
+
+def benchmark(args):
+	labels_path = join(args.data_root, "labels.csv")
+	if isfile(labels_path):
+		labels = read_labels(labels_path)
+	else:
+		labels_path = None
+		names = sorted(name for name in listdir(args.data_root) if isdir(join(args.data_root, name)))
+		labels = {name: num+1 for num, name in enumerate(names)}
+	if not isdir(args.tables):
+		train(Namespace(file_path=args.data_root, output=args.tables, labels=labels_path, workers=args.workers,
+				min_support=1, determinism=0.0, deterministic=False, approx_k=None, epsilon=0.001, delta=0.01))
+	predictors = load_predictors(args.tables)
+
+	best = {}
+	answers = {}
+	for i in range(args.repeat):
+		timings, answers = run_once(args.data_root, predictors, args.workers)
+		for stage, seconds in timings.items():
+			best[stage] = min(best.get(stage, seconds), seconds)
+
+	correct = sum(1 for name, person in answers.items() if labels.get(name) == person)
+	result = {
+			"commit": commit(),
+			"date": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+			"data_root": args.data_root,
+			"testcases": len(answers),
+			"repeat": args.repeat,
+			"workers": args.workers,
+			"seconds": {stage: round(best[stage], 6) for stage in STAGES if stage in best},
+			"accuracy": correct / len(answers) if answers else 0,
+			"answers": answers}
+
+	previous = None
+	if args.output and isfile(args.output):
+		with open(args.output, 'r') as f:
+			for l in f:
+				run = json.loads(l)
+				if run.get("data_root") == args.data_root:
+					previous = run
+
+	for stage, seconds in result["seconds"].items():
+		line = "{:<18}{:>12.4f}s".format(stage, seconds)
+		if previous is not None and previous["seconds"].get(stage):
+			line += "{:>10.2f}x vs {}".format(seconds / previous["seconds"][stage], previous["commit"])
+		print(line)
+	print("accuracy {:.2%} over {} test cases".format(result["accuracy"], result["testcases"]))
+	if previous is not None and previous["answers"] != answers:
+		print("answers differ from {}".format(previous["commit"]))
+
+	if args.output:
+		with open(args.output, 'a') as f:
+			f.write(json.dumps(result, sort_keys=True) + "\n")
+
+if __name__ == "__main__":
+
+	parser = ArgumentParser()
+	parser.add_argument("data_root", help="root path of labelled test cases, see gen_dataset.py")
+	parser.add_argument("--tables", default="trained", help="train.py output, trained from data_root if missing")
+	parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest is kept")
+	parser.add_argument("--workers", type=int, default=1, help="processes used to parse one Wireshark.json")
+	parser.add_argument("-o", "--output", default="benchmark.jsonl", help="results of every run are appended here")
+	args = parser.parse_args()
+
+	benchmark(args)
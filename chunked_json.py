@@ -0,0 +1,128 @@
+from os.path import getsize
+import json
+import mmap
+import re
+import multiprocessing as mp
+
+# tshark -T json writes one top level array of packets, a packet starts at
+# the "{" of "[ {" or "}, {"; candidates found inside strings are rejected
+# because they do not decode to a packet
+FIRST_PACKET = re.compile(rb'\[\s*\{')
+NEXT_PACKET = re.compile(rb'\}\s*,\s*\{')
+WHITESPACE = b' \t\r\n'
+# what is left of a literal or number cut off by the end of the buffer
+CUT_VALUE = re.compile(r'(n(u(ll?)?)?|t(r(ue?)?)?|f(a(l(se?)?)?)?|[-+.eE0-9]+)\Z')
+
+MIN_CHUNK = 1 << 24
+WINDOW = 1 << 22
+
+def is_packet(obj):
+	return isinstance(obj, dict) and '_source' in obj
+
+class PacketReader:
+	def __init__(self, mm, window=WINDOW):
+		self.mm = mm
+		self.window = window
+		self.decoder = json.JSONDecoder()
+		self.buf = ""
+		self.buf_start = 0
+
+	def decode(self, pos):
+		# latin-1 keeps one character per byte, so string and file offsets agree
+		window = self.window
+		while True:
+			i = pos - self.buf_start
+			if 0 <= i < len(self.buf):
+				try:
+					obj, end = self.decoder.raw_decode(self.buf, i)
+					return obj, self.buf_start + end
+				except json.JSONDecodeError as e:
+					# only a value cut off by the end of the buffer needs a larger
+					# window, anything else is a false candidate and fails at once
+					truncated = self.truncated(e)
+					if not truncated or self.buf_start + len(self.buf) >= len(self.mm):
+						raise
+					if i == 0:
+						window = len(self.buf) * 2
+			self.buf_start = pos
+			self.buf = self.mm[pos:pos + window].decode("latin-1")
+
+	def truncated(self, e):
+		if e.pos >= len(self.buf) or e.msg.startswith("Unterminated string"):
+			return True
+		if e.msg.startswith("Invalid \\uXXXX escape"):
+			return e.pos + 5 >= len(self.buf)
+		return CUT_VALUE.match(self.buf, e.pos) is not None
+
+	def next_start(self, pos):
+		size = len(self.mm)
+		while pos < size and self.mm[pos] in WHITESPACE:
+			pos += 1
+		if pos >= size or self.mm[pos] != ord(','):
+			return None
+		pos += 1
+		while pos < size and self.mm[pos] in WHITESPACE:
+			pos += 1
+		return pos
+
+	def first_start(self, start):
+		if start == 0:
+			match = FIRST_PACKET.search(self.mm)
+			if match is None:
+				return None, None
+			pos = match.end() - 1
+			return pos, self.decode(pos)
+
+		for match in NEXT_PACKET.finditer(self.mm, max(0, start - 64)):
+			pos = match.end() - 1
+			if pos < start:
+				continue
+			try:
+				obj, end = self.decode(pos)
+			except ValueError:
+				continue
+			if is_packet(obj):
+				return pos, (obj, end)
+		return None, None
+
+	def packets(self, start, end):
+		# every packet whose "{" lies in [start, end)
+		pos, decoded = self.first_start(start)
+		while pos is not None and pos < end:
+			obj, nxt = decoded
+			yield obj
+			pos = self.next_start(nxt)
+			if pos is not None and pos < end:
+				decoded = self.decode(pos)
+
+def read_chunk(args):
+	path, start, end, func = args
+	with open(path, 'rb') as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	try:
+		return func(PacketReader(mm).packets(start, end))
+	finally:
+		mm.close()
+
+def chunk_ranges(path, workers, min_chunk=MIN_CHUNK):
+	size = getsize(path)
+	n = max(1, min(workers * 4, size // min_chunk))
+	return [(i * size // n, (i + 1) * size // n) for i in range(n)]
+
+def map_chunks(path, func, workers=None, min_chunk=MIN_CHUNK):
+	# func gets an iterator over the packets of one byte range and returns a
+	# partial result, the partials come back in file order
+	workers = workers or mp.cpu_count()
+	tasks = [(path, start, end, func) for start, end in chunk_ranges(path, workers, min_chunk)]
+	if len(tasks) == 1 or workers == 1:
+		return [read_chunk(task) for task in tasks]
+	with mp.Pool(workers) as pool:
+		return pool.map(read_chunk, tasks)
+
+def iter_packets(path):
+	with open(path, 'rb') as f:
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	try:
+		yield from PacketReader(mm).packets(0, len(mm))
+	finally:
+		mm.close()
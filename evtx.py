@@ -0,0 +1,216 @@
+import struct
+from datetime import datetime, timedelta
+try:
+	import xml.etree.cElementTree as ET
+except ImportError:
+	import xml.etree.ElementTree as ET
+
+# Reads Security/Sysmon .evtx files without the XML export. Only the System
+# fields the predictors and LogXml.statistics use are decoded from the
+# binary XML, everything else is skipped by size.
+
+FILE_SIGNATURE = b"ElfFile\0"
+CHUNK_SIGNATURE = b"ElfChnk\0"
+RECORD_SIGNATURE = b"\x2a\x2a\x00\x00"
+FILE_HEADER_SIZE = 4096
+CHUNK_SIZE = 65536
+CHUNK_HEADER_SIZE = 512
+
+EVENT_NS = "http://schemas.microsoft.com/win/2004/08/events/event"
+
+# (element, attribute) under <System> -> record field
+FIELDS = {
+		("EventID", None): "EventID",
+		("Task", None): "Task",
+		("Execution", "ProcessID"): "ProcessID",
+		("TimeCreated", "SystemTime"): "TimeCreated",
+		("EventRecordID", None): "RecordID"}
+
+FILETIME_EPOCH = datetime(1601, 1, 1)
+
+def filetime(value):
+	time = FILETIME_EPOCH + timedelta(microseconds=value // 10)
+	return time.strftime("%Y-%m-%dT%H:%M:%S.") + "{:07d}00Z".format(value % 10000000)
+
+def decode_value(vtype, data):
+	if vtype == 0x01:
+		return data.decode("utf-16-le").rstrip("\0")
+	if vtype == 0x02:
+		return data.decode("latin-1").rstrip("\0")
+	if vtype in (0x03, 0x05, 0x07, 0x09):
+		return str(int.from_bytes(data, "little", signed=True))
+	if vtype in (0x04, 0x06, 0x08, 0x0a, 0x0d):
+		return str(int.from_bytes(data, "little"))
+	if vtype == 0x11:
+		return filetime(int.from_bytes(data, "little"))
+	if vtype in (0x14, 0x15):
+		return "0x{:0{}x}".format(int.from_bytes(data, "little"), len(data) * 2)
+	return None
+
+class Chunk:
+	def __init__(self, data):
+		self.data = data
+		self.templates = {}
+
+	def u16(self, pos):
+		return struct.unpack_from("<H", self.data, pos)[0]
+
+	def u32(self, pos):
+		return struct.unpack_from("<I", self.data, pos)[0]
+
+	def name(self, offset):
+		count = self.u16(offset + 6)
+		return self.data[offset + 8:offset + 8 + count * 2].decode("utf-16-le"), offset + 10 + count * 2
+
+	def name_ref(self, pos):
+		# names are chunk offsets, stored inline the first time they are used
+		offset = self.u32(pos)
+		pos += 4
+		if offset == pos:
+			return self.name(offset)
+		return self.name(offset)[0], pos
+
+	def template(self, offset):
+		if offset not in self.templates:
+			fields = {}
+			self.fragment(offset + 24, fields)
+			self.templates[offset] = fields
+		return self.templates[offset]
+
+	def fragment(self, pos, fields):
+		# walks binary xml tokens from pos up to the end of fragment token,
+		# fields collects ("lit", text) or ("sub", index) for FIELDS
+		data = self.data
+		stack = []
+		attr = None
+
+		def key():
+			if "System" not in stack:
+				return None
+			return FIELDS.get((stack[-1], attr))
+
+		while pos < len(data):
+			token = data[pos]
+			base = token & 0xbf
+			if base == 0x00:
+				return pos + 1
+			elif base == 0x0f:
+				pos += 4
+			elif base == 0x01:
+				name, pos = self.name_ref(pos + 7)
+				if token & 0x40:
+					pos += 4
+				stack.append(name)
+				attr = None
+			elif base == 0x02:
+				pos += 1
+				attr = None
+			elif base in (0x03, 0x04):
+				pos += 1
+				attr = None
+				if stack:
+					stack.pop()
+			elif base == 0x06:
+				attr, pos = self.name_ref(pos + 1)
+			elif base == 0x05:
+				vtype = data[pos + 1]
+				count = self.u16(pos + 2)
+				text = data[pos + 4:pos + 4 + count * 2].decode("utf-16-le")
+				pos += 4 + count * 2
+				if key() is not None and vtype == 0x01:
+					fields[key()] = ("lit", text)
+			elif base == 0x07 or base == 0x0b:
+				pos += 3 + self.u16(pos + 1) * 2
+			elif base == 0x08:
+				pos += 3
+			elif base in (0x09, 0x0a):
+				pos = self.name_ref(pos + 1)[1]
+			elif base in (0x0d, 0x0e):
+				if key() is not None:
+					fields[key()] = ("sub", self.u16(pos + 1))
+				pos += 4
+			elif base == 0x0c:
+				pos = self.template_instance(pos, fields)
+			else:
+				raise ValueError("unknown binary xml token 0x{:02x}".format(token))
+		return pos
+
+	def template_instance(self, pos, fields):
+		offset = self.u32(pos + 6)
+		pos += 10
+		if offset == pos:
+			pos += 24 + self.u32(pos + 20)
+		template = self.template(offset)
+
+		count = self.u32(pos)
+		pos += 4
+		values = []
+		for i in range(count):
+			size, vtype = struct.unpack_from("<HB", self.data, pos + i * 4)
+			values.append((size, vtype))
+		pos += count * 4
+		spans = []
+		for size, vtype in values:
+			spans.append((pos, size, vtype))
+			pos += size
+
+		for field, (kind, value) in template.items():
+			if kind == "lit":
+				fields[field] = (kind, value)
+			elif value < len(spans):
+				start, size, vtype = spans[value]
+				decoded = decode_value(vtype, self.data[start:start + size])
+				if decoded is not None:
+					fields[field] = ("lit", decoded)
+		return pos
+
+	def records(self):
+		free = self.u32(48)
+		pos = CHUNK_HEADER_SIZE
+		while pos + 24 < min(free, len(self.data)):
+			if self.data[pos:pos + 4] != RECORD_SIGNATURE:
+				break
+			size = self.u32(pos + 4)
+			if size < 28:
+				break
+			fields = {}
+			try:
+				self.fragment(pos + 24, fields)
+			except (struct.error, IndexError, ValueError, UnicodeDecodeError):
+				# a damaged record only loses itself
+				fields = {}
+			record = {field: value for field, (kind, value) in fields.items() if kind == "lit"}
+			# the record header number only when the event has no EventRecordID
+			record.setdefault("RecordID", str(struct.unpack_from("<Q", self.data, pos + 8)[0]))
+			yield record
+			pos += size
+
+def iter_records(path):
+	with open(path, 'rb') as f:
+		header = f.read(FILE_HEADER_SIZE)
+		if header[:8] != FILE_SIGNATURE:
+			raise ValueError("{} is not an evtx file".format(path))
+		while True:
+			data = f.read(CHUNK_SIZE)
+			if len(data) < CHUNK_HEADER_SIZE:
+				return
+			if data[:8] != CHUNK_SIGNATURE:
+				continue
+			yield from Chunk(data).records()
+
+def build_tree(records):
+	# the same shape as the exported xml, so LogXml users need no change
+	ns = "{" + EVENT_NS + "}"
+	root = ET.Element("Events")
+	for record in records:
+		event = ET.SubElement(root, ns + "Event")
+		system = ET.SubElement(event, ns + "System")
+		for tag in ("EventID", "Task"):
+			if tag in record:
+				ET.SubElement(system, ns + tag).text = record[tag]
+		if "TimeCreated" in record:
+			ET.SubElement(system, ns + "TimeCreated", SystemTime=record["TimeCreated"])
+		if "ProcessID" in record:
+			ET.SubElement(system, ns + "Execution", ProcessID=record["ProcessID"])
+		ET.SubElement(system, ns + "EventRecordID").text = record["RecordID"]
+	return root
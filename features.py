@@ -0,0 +1,215 @@
+from os.path import getsize, getmtime, isfile
+import pickle
+from array import array
+from chunked_json import map_chunks, iter_packets
+from window import packet_time
+import pcap
+
+# One pass over a capture builds its sparse feature vector: the value@field
+# keys of every packet (the WiresharkStatistics walk), the layers of every
+# packet and its time. Statistics, training and prediction all read this
+# instead of walking the raw packets again, and it is cached next to the
+# capture as <capture>.features.
+
+VERSION = 2
+
+PROTOCOLS = [
+		"ntp",
+		"dhcp",
+		"dhcpv6",
+		"ipv6",
+		"http",
+		"arp",
+		"nbns",
+		"dns",
+		"data",
+		"udp",
+		"tcp.segments",
+		"tls",
+		"tcp",
+		"ip",
+		"frame",
+		"eth"]
+
+# the layer fields WiresharkPredictor scores
+OBSERVED_PROTOCOL_FIELD = {
+		"http": ["http.host"],
+		"dns": ["dns.qry.name","dns.resp.name"],
+		"ip":["ip.src","ip.dst"]}
+
+def packet_fields(packet, protocols=PROTOCOLS):
+	field_in_packet = []
+	seen = set()
+
+	def dfs(parent, node):
+		if type(node) is list:
+			# repeated fields and layers, every item under the same name
+			for item in node:
+				if item is not None:
+					dfs(parent, item)
+			return None
+		if type(node) is not dict:
+			field = node + "@" + parent
+			if field not in seen:
+				seen.add(field)
+				field_in_packet.append(field)
+			return None
+
+		for n in node:
+			if node[n] is not None:
+				dfs(n, node[n])
+
+	for layer in packet['_source']['layers']:
+		if layer in protocols:
+			dfs("layers", packet['_source']['layers'][layer])
+
+	return field_in_packet
+
+class CaptureFeatures:
+	def __init__(self):
+		self.vocab = []
+		self.ids = {}
+		self.layer_vocab = []
+		self.layer_ids = {}
+		self.packet_fields = []
+		self.packet_layers = []
+		self.times = array('d')
+		self.field_count = {}
+		self.layer_count = {}
+
+	def __len__(self):
+		return len(self.packet_fields)
+
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		del state["ids"], state["layer_ids"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.ids = {key: i for i, key in enumerate(self.vocab)}
+		self.layer_ids = {layer: i for i, layer in enumerate(self.layer_vocab)}
+
+	def field_id(self, key):
+		if key not in self.ids:
+			self.ids[key] = len(self.vocab)
+			self.vocab.append(key)
+		return self.ids[key]
+
+	def layer_id(self, layer):
+		if layer not in self.layer_ids:
+			self.layer_ids[layer] = len(self.layer_vocab)
+			self.layer_vocab.append(layer)
+		return self.layer_ids[layer]
+
+	def add_packet(self, keys, layers, time):
+		self.add_ids(array('I', [self.field_id(key) for key in keys]),
+				array('I', [self.layer_id(layer) for layer in layers]), time)
+
+	def add_ids(self, fields, layers, time):
+		self.packet_fields.append(fields)
+		self.packet_layers.append(layers)
+		self.times.append(time if time is not None else float('nan'))
+		for i in fields:
+			self.field_count[i] = self.field_count.get(i, 0) + 1
+		for i in layers:
+			self.layer_count[i] = self.layer_count.get(i, 0) + 1
+
+	def add(self, packet):
+		self.add_packet(packet_fields(packet), list(packet['_source']['layers']), packet_time(packet))
+
+	def extend(self, other):
+		# appends the packets of a later chunk, remapping its ids
+		field_map = [self.field_id(key) for key in other.vocab]
+		layer_map = [self.layer_id(layer) for layer in other.layer_vocab]
+		for fields, layers, time in zip(other.packet_fields, other.packet_layers, other.times):
+			self.add_ids(array('I', [field_map[i] for i in fields]),
+					array('I', [layer_map[i] for i in layers]), time)
+
+	def fields(self, observed_protocol_field):
+		# the capture level set WiresharkPredictor scores: observed layers and
+		# the value@field keys of their observed fields
+		observed = {field for proto in observed_protocol_field for field in observed_protocol_field[proto]}
+		field_count = {}
+		for proto in observed_protocol_field:
+			if proto in self.layer_ids:
+				field_count[proto] = 1
+		for i in self.field_count:
+			if self.vocab[i].rsplit('@', 1)[-1] in observed:
+				field_count[self.vocab[i]] = 1
+		return field_count
+
+	def field_counts(self):
+		return {self.vocab[i]: count for i, count in self.field_count.items()}
+
+	def layer_counts(self):
+		return {self.layer_vocab[i]: count for i, count in self.layer_count.items()}
+
+	def events(self, observed_protocol_field=None):
+		# (time, keys) per packet for window.windows
+		observed = None
+		if observed_protocol_field is not None:
+			observed = {field for proto in observed_protocol_field for field in observed_protocol_field[proto]}
+		for fields, layers, time in zip(self.packet_fields, self.packet_layers, self.times):
+			if time != time:
+				continue
+			if observed is None:
+				keys = [self.vocab[i] for i in fields]
+			else:
+				keys = [self.layer_vocab[i] for i in layers if self.layer_vocab[i] in observed_protocol_field]
+				keys += [self.vocab[i] for i in fields if self.vocab[i].rsplit('@', 1)[-1] in observed]
+			yield time, keys
+
+def build_partial(packets):
+	features = CaptureFeatures()
+	for packet in packets:
+		features.add(packet)
+	return features
+
+def source_stamp(path):
+	return getsize(path), getmtime(path)
+
+def cache_path(path):
+	return path + ".features"
+
+def load_cache(path):
+	if not isfile(cache_path(path)):
+		return None
+	try:
+		with open(cache_path(path), 'rb') as f:
+			cached = pickle.load(f)
+	except (pickle.UnpicklingError, EOFError, AttributeError):
+		return None
+	if cached.get("version") != VERSION or cached.get("source") != source_stamp(path):
+		return None
+	return cached["features"]
+
+def save_cache(path, features):
+	try:
+		with open(cache_path(path), 'wb') as f:
+			pickle.dump({"version": VERSION, "source": source_stamp(path), "features": features}, f,
+					protocol=pickle.HIGHEST_PROTOCOL)
+	except OSError:
+		print("Cannot write feature cache for {}".format(path))
+
+def iter_capture(path):
+	if path.endswith("json"):
+		return iter_packets(path)
+	return pcap.iter_packets(path)
+
+def capture_features(path, workers=1, cache=True):
+	if cache:
+		features = load_cache(path)
+		if features is not None:
+			return features
+
+	if path.endswith("json") and workers > 1:
+		features = CaptureFeatures()
+		for part in map_chunks(path, build_partial, workers):
+			features.extend(part)
+	else:
+		features = build_partial(iter_capture(path))
+
+	if cache:
+		save_cache(path, features)
+	return features
@@ -0,0 +1,315 @@
+import ipaddress
+
+# second level labels under two letter country code TLDs that are not
+# registrable on their own (www.example.co.uk -> example.co.uk)
+SECOND_LEVEL = {"co", "com", "net", "org", "gov", "edu", "ac", "ne", "or", "go"}
+
+DOMAIN_FIELDS = ["dns.qry.name", "dns.resp.name", "http.host"]
+IP_FIELDS = ["ip.src", "ip.dst"]
+
+# The tries below only build the index. It is flattened into a table of
+#   "=field@suffix"   suffix / prefix rule  -> (counts, 0), or the summed
+#                     counts and entry count of a collapsed subtree
+#   "~field@suffix"   entries under a node  -> (summed counts, entry count)
+#   "#field/bits"     prefix lengths that have rules
+# which lookup() reads with one probe per label (or prefix length), so the
+# same table serves from a dict or straight from the compiled model.
+RULE = "="
+AGG = "~"
+PLENS = "#"
+
+def add_counts(dst, src, scale=1):
+	for person, count in src.items():
+		dst[person] = dst.get(person, 0) + count * scale
+
+def mean_counts(counts, size):
+	return {person: count/size for person, count in counts.items()}
+
+class DomainNode:
+	__slots__ = ("children", "counts", "agg", "size", "suffix", "collapsed")
+
+	def __init__(self):
+		self.children = {}
+		self.counts = None
+		self.agg = {}
+		self.size = 0
+		self.suffix = False
+		self.collapsed = False
+
+class DomainTrie:
+	def __init__(self):
+		self.root = DomainNode()
+		self.size = 0
+
+	@staticmethod
+	def labels(name):
+		return name.rstrip('.').lower().split('.')[::-1]
+
+	@staticmethod
+	def registrable_depth(labels):
+		# in-addr.arpa names are matched on their /24, ip6.arpa on their /64
+		if labels[0] == "arpa" and len(labels) > 1:
+			if labels[1] == "in-addr":
+				return 5
+			return 18
+		if len(labels) > 2 and len(labels[0]) == 2 and labels[1] in SECOND_LEVEL:
+			return 3
+		return 2
+
+	def insert(self, name, counts, suffix=False):
+		if name.startswith("*."):
+			name = name[2:]
+			suffix = True
+		node = self.root
+		path = [node]
+		for label in self.labels(name):
+			if label not in node.children:
+				node.children[label] = DomainNode()
+			node = node.children[label]
+			path.append(node)
+
+		duplicate = node.counts is not None
+		if not duplicate:
+			node.counts = {}
+			self.size += 1
+			for n in path:
+				n.size += 1
+		add_counts(node.counts, counts)
+		node.suffix = node.suffix or suffix
+		for n in path:
+			add_counts(n.agg, counts)
+		return duplicate
+
+	def compact(self):
+		# collapse registrable subtrees whose entries all point to one person into
+		# a single "*.suffix" rule holding their sums, only the stored index
+		# shrinks, the exact rows are kept as they are (see README)
+		def visit(node, labels):
+			if node.suffix:
+				return
+			if labels and len(labels) >= self.registrable_depth(labels) and node.children and len(node.agg) == 1:
+				node.children = {}
+				node.counts = node.agg
+				node.suffix = True
+				node.collapsed = True
+				return
+			for label, child in node.children.items():
+				visit(child, labels + [label])
+
+		visit(self.root, [])
+		self.size = sum(1 for _ in self.items())
+
+	def rows(self, field):
+		stack = [(self.root, [], None)]
+		while stack:
+			node, labels, parent = stack.pop()
+			name = '.'.join(labels[::-1])
+			if node.suffix:
+				# nothing below a rule is reached
+				yield RULE + field + "@" + name, node.counts, node.size if node.collapsed else 0
+				continue
+			# a parent holding the same entries answers the same fallback, as
+			# long as lookup still reaches it from names below this node
+			same = len(labels) >= 3 and parent.size == node.size and \
+					len(labels) - 1 >= self.registrable_depth(labels)
+			if len(labels) >= 2 and not same:
+				yield AGG + field + "@" + name, node.agg, node.size
+			for label, child in node.children.items():
+				stack.append((child, labels + [label], node))
+
+	def items(self):
+		stack = [(self.root, [])]
+		while stack:
+			node, labels = stack.pop()
+			if node.counts is not None:
+				name = '.'.join(labels[::-1])
+				yield ("*." + name if node.suffix else name), node.counts
+			for label, child in node.children.items():
+				stack.append((child, labels + [label]))
+
+class CidrNode:
+	__slots__ = ("key", "plen", "children", "counts", "agg", "size")
+
+	def __init__(self, key, plen):
+		self.key = key
+		self.plen = plen
+		self.children = [None, None]
+		self.counts = None
+		self.agg = {}
+		self.size = 0
+
+class CidrRadix:
+	# path compressed binary trie over IPv4 and IPv6 prefixes
+	# unseen addresses fall back to the entries of their /24 (/64)
+	fallback_plen = {32: 24, 128: 64}
+
+	def __init__(self):
+		self.roots = {32: CidrNode(0, 0), 128: CidrNode(0, 0)}
+		self.size = 0
+
+	@staticmethod
+	def parse(prefix):
+		net = ipaddress.ip_network(prefix, strict=False)
+		return int(net.network_address), net.prefixlen, net.max_prefixlen
+
+	@staticmethod
+	def bit(key, pos, bits):
+		return (key >> (bits - 1 - pos)) & 1
+
+	@staticmethod
+	def common(a, b, limit, bits):
+		diff = a ^ b
+		length = bits - diff.bit_length() if diff else bits
+		return min(length, limit)
+
+	def insert(self, prefix, counts):
+		key, plen, bits = self.parse(prefix)
+		node = self.roots[bits]
+		path = [node]
+		while True:
+			if node.plen == plen:
+				break
+			b = self.bit(key, node.plen, bits)
+			child = node.children[b]
+			if child is None:
+				child = CidrNode(key, plen)
+				node.children[b] = child
+				node = child
+				path.append(node)
+				break
+			length = self.common(key, child.key, min(plen, child.plen), bits)
+			if length == child.plen:
+				node = child
+				path.append(node)
+				continue
+			mask = ~((1 << (bits - length)) - 1)
+			split = CidrNode(key & mask, length)
+			split.children[self.bit(child.key, length, bits)] = child
+			add_counts(split.agg, child.agg)
+			split.size = child.size
+			node.children[b] = split
+			node = split
+			path.append(node)
+
+		duplicate = node.counts is not None
+		if not duplicate:
+			node.counts = {}
+			self.size += 1
+			for n in path:
+				n.size += 1
+		add_counts(node.counts, counts)
+		for n in path:
+			add_counts(n.agg, counts)
+		return duplicate
+
+	@staticmethod
+	def network(key, plen, bits):
+		mask = ((1 << plen) - 1) << (bits - plen)
+		return str(ipaddress.ip_network((key & mask, plen)))
+
+	def rows(self, field):
+		# prefix rules, and every entry summed into its /24 (/64) bucket
+		for bits, root in self.roots.items():
+			plens = {}
+			buckets = {}
+			stack = [root]
+			while stack:
+				node = stack.pop()
+				stack.extend(child for child in node.children if child is not None)
+				if node.counts is None:
+					continue
+				if node.plen < bits:
+					plens[node.plen] = plens.get(node.plen, 0) + 1
+					yield RULE + field + "@" + self.network(node.key, node.plen, bits), node.counts, 0
+				fallback = self.fallback_plen[bits]
+				if node.plen >= fallback:
+					bucket = self.network(node.key, fallback, bits)
+					counts, size = buckets.get(bucket, ({}, 0))
+					add_counts(counts, node.counts)
+					buckets[bucket] = (counts, size + 1)
+			if plens:
+				yield PLENS + field + "/" + str(bits), plens, 0
+			for bucket, (counts, size) in buckets.items():
+				yield AGG + field + "@" + bucket, counts, size
+
+class FieldIndex:
+	def __init__(self):
+		self.domains = {field: DomainTrie() for field in DOMAIN_FIELDS}
+		self.networks = {field: CidrRadix() for field in IP_FIELDS}
+
+	def __contains__(self, field):
+		return field in self.domains or field in self.networks
+
+	def insert(self, key, counts):
+		value, field = key.rsplit('@', 1)
+		if field in self.domains:
+			return self.domains[field].insert(value, counts)
+		return self.networks[field].insert(value, counts)
+
+	def table(self):
+		table = {}
+		for field, trie in list(self.domains.items()) + list(self.networks.items()):
+			for key, counts, size in trie.rows(field):
+				table[key] = (counts, size)
+		return table
+
+	def compact(self):
+		for trie in self.domains.values():
+			trie.compact()
+
+	def __len__(self):
+		return sum(t.size for t in self.domains.values()) + sum(r.size for r in self.networks.values())
+
+def build_index(rows):
+	# rows: value@field -> counts, the flattened index of their domain/ip fields
+	index = FieldIndex()
+	for key, counts in rows.items():
+		if key.rsplit('@', 1)[-1] in index:
+			index.insert(key, counts)
+	index.compact()
+	return index.table()
+
+def lookup_domain(entry, field, name):
+	labels = DomainTrie.labels(name)
+	suffixes = ['.'.join(labels[:i][::-1]) for i in range(1, len(labels)+1)]
+	for suffix in suffixes:
+		# "*.suffix" rules, the shortest one wins
+		res = entry(RULE + field + "@" + suffix)
+		if res is not None:
+			return mean_counts(*res) if res[1] else res[0]
+	for suffix in reversed(suffixes[DomainTrie.registrable_depth(labels)-1:]):
+		# the deepest known suffix at or below the registrable domain
+		res = entry(AGG + field + "@" + suffix)
+		if res is not None:
+			return mean_counts(*res)
+	return None
+
+def lookup_network(entry, field, address):
+	key, plen, bits = CidrRadix.parse(address)
+	plens = entry(PLENS + field + "/" + str(bits))
+	if plens is not None:
+		for rule_plen in sorted(plens[0], reverse=True):
+			if rule_plen > plen:
+				continue
+			res = entry(RULE + field + "@" + CidrRadix.network(key, rule_plen, bits))
+			if res is not None:
+				return res[0]
+	res = entry(AGG + field + "@" + CidrRadix.network(key, CidrRadix.fallback_plen[bits], bits))
+	if res is not None:
+		return mean_counts(*res)
+	return None
+
+def lookup(entry, key):
+	# counts guessed for a value@field without an exact row, or None;
+	# entry(key) -> (counts, size) or None reads the flattened index
+	if '@' not in key:
+		return None
+	value, field = key.rsplit('@', 1)
+	try:
+		if field in DOMAIN_FIELDS:
+			return lookup_domain(entry, field, value)
+		if field in IP_FIELDS:
+			return lookup_network(entry, field, value)
+	except ValueError:
+		pass
+	return None
@@ -0,0 +1,67 @@
+from bisect import bisect_left, insort
+
+# Fields bucketed by their count, with the distinct counts kept sorted.
+# Counting a field moves it to the next bucket in O(1) (plus a bisect when a
+# count appears or disappears), and support bands / top k are answered with
+# a bisect over the distinct counts instead of a scan over every field.
+# There are at most ~sqrt(2 * total) distinct counts, so the sorted list
+# stays short even with millions of fields.
+
+class FrequencyIndex:
+	def __init__(self, items=()):
+		self.counts = {}
+		self.buckets = {}
+		self.distinct = []
+		for key, count in items:
+			self.add(key, count)
+
+	def __len__(self):
+		return len(self.counts)
+
+	def __contains__(self, key):
+		return key in self.counts
+
+	def __getitem__(self, key):
+		return self.counts[key]
+
+	def __iter__(self):
+		# fields by ascending count
+		for count in self.distinct:
+			yield from self.buckets[count]
+
+	def link(self, key, count):
+		if count not in self.buckets:
+			self.buckets[count] = {}
+			insort(self.distinct, count)
+		self.buckets[count][key] = None
+
+	def unlink(self, key, count):
+		bucket = self.buckets[count]
+		del bucket[key]
+		if not bucket:
+			del self.buckets[count]
+			del self.distinct[bisect_left(self.distinct, count)]
+
+	def add(self, key, count=1):
+		old = self.counts.get(key, 0)
+		if old:
+			self.unlink(key, old)
+		self.counts[key] = old + count
+		self.link(key, old + count)
+
+	def range(self, low, high=None):
+		# (field, count) with low <= count < high, ascending
+		start = bisect_left(self.distinct, low)
+		end = len(self.distinct) if high is None else bisect_left(self.distinct, high)
+		for count in self.distinct[start:end]:
+			for key in self.buckets[count]:
+				yield key, count
+
+	def top(self, k):
+		res = []
+		for count in reversed(self.distinct):
+			for key in self.buckets[count]:
+				if len(res) == k:
+					return res
+				res.append((key, count))
+		return res
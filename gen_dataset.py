@@ -0,0 +1,151 @@
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join
+import json
+import random
+from datetime import datetime, timezone
+
+# Synthetic labelled test cases for benchmarks and regression runs:
+#   python gen_dataset.py OUT --persons 3 --cases 2 --size 10MB --seed 1
+# writes OUT/caseNNN/{Security.xml,Sysmon.xml,Wireshark.json} and
+# OUT/labels.csv for train.py --labels. The same seed gives the same bytes.
+# Every person has its own hosts, addresses and process ids mixed with
+# values shared by everyone, so the tables learned from them are not trivial.
+
+EVENT_NS = "http://schemas.microsoft.com/win/2004/08/events/event"
+START_TIME = 1590998400.0
+UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+
+SHARED_DOMAINS = ["www.google.com", "update.microsoft.com", "ocsp.digicert.com", "www.bing.com"]
+SHARED_IPS = ["8.8.8.8", "13.107.4.50", "172.217.160.68", "192.168.0.1"]
+SECURITY_EVENTS = [("4624", "12544"), ("4634", "12545"), ("4672", "12548"), ("4688", "13312"), ("4689", "13313")]
+SYSMON_EVENTS = [("1", "1"), ("3", "3"), ("5", "5"), ("11", "11"), ("22", "22")]
+
+def parse_size(text):
+	text = text.strip().upper()
+	for unit, scale in UNITS.items():
+		if text.endswith(unit):
+			return int(float(text[:-len(unit)]) * scale)
+	return int(text)
+
+class Profile:
+	# the values one person tends to produce
+	def __init__(self, person, seed):
+		rng = random.Random("{}:person:{}".format(seed, person))
+		self.person = person
+		self.domains = ["p{}-{}.{}".format(person, i, rng.choice(["com", "net", "org", "io"])) for i in range(8)]
+		self.ips = ["10.{}.{}.{}".format(person % 256, rng.randrange(256), rng.randrange(1, 255)) for i in range(8)]
+		self.pids = [str(rng.randrange(1000, 65536) // 4 * 4) for i in range(4)]
+		self.security = rng.sample(SECURITY_EVENTS, 2)
+		self.sysmon = rng.sample(SYSMON_EVENTS, 2)
+
+def system_time(time):
+	text = datetime.fromtimestamp(time, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.")
+	return text + "{:07d}Z".format(int(time % 1 * 10000000))
+
+def event_xml(profile, rng, record, time, own_events, all_events, provider):
+	event_id, task = rng.choice(own_events if rng.random() < 0.6 else all_events)
+	pid = rng.choice(profile.pids) if rng.random() < 0.7 else "4"
+	return ('<Event xmlns="{ns}"><System><Provider Name="{provider}"/><EventID>{event_id}</EventID>'
+			'<Version>0</Version><Level>0</Level><Task>{task}</Task><Opcode>0</Opcode>'
+			'<Keywords>0x8020000000000000</Keywords><TimeCreated SystemTime="{time}"/>'
+			'<EventRecordID>{record}</EventRecordID><Correlation/>'
+			'<Execution ProcessID="{pid}" ThreadID="{thread}"/><Channel>{provider}</Channel>'
+			'<Computer>host{person}</Computer><Security/></System></Event>\n').format(
+			ns=EVENT_NS, provider=provider, event_id=event_id, task=task, time=system_time(time),
+			record=record, pid=pid, thread=rng.randrange(1000, 20000), person=profile.person)
+
+def write_xml(path, profile, rng, size, own_events, all_events, provider):
+	# exports list the newest event first, so time runs backwards from START_TIME
+	with open(path, 'w') as f:
+		f.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n<Events>\n')
+		time = START_TIME
+		record = 0
+		while f.tell() < size:
+			time -= rng.expovariate(2.0)
+			record += 1
+			f.write(event_xml(profile, rng, record, time, own_events, all_events, provider))
+		f.write('</Events>\n')
+
+def packet(profile, rng, number, time):
+	src = rng.choice(profile.ips)
+	dst = rng.choice(profile.ips) if rng.random() < 0.3 else rng.choice(SHARED_IPS)
+	layers = {
+			"frame": {
+				"frame.time": datetime.fromtimestamp(time, timezone.utc).strftime("%b %d, %Y %H:%M:%S.%f000 UTC"),
+				"frame.time_epoch": "{:.9f}".format(time),
+				"frame.number": str(number),
+				"frame.len": str(rng.randrange(60, 1500)),
+				"frame.protocols": "eth:ethertype:ip:udp"},
+			"eth": {
+				"eth.src": "02:00:00:00:{:02x}:01".format(profile.person % 256),
+				"eth.dst": "02:00:00:00:00:fe",
+				"eth.type": "0x00000800"},
+			"ip": {
+				"ip.version": "4",
+				"ip.ttl": "128",
+				"ip.src": src,
+				"ip.dst": dst}}
+	kind = rng.random()
+	if kind < 0.3:
+		domain = rng.choice(profile.domains) if rng.random() < 0.6 else rng.choice(SHARED_DOMAINS)
+		layers["udp"] = {"udp.srcport": str(rng.randrange(49152, 65536)), "udp.dstport": "53"}
+		layers["dns"] = {"dns.id": "0x{:04x}".format(rng.randrange(65536)), "dns.qry.name": domain}
+		if rng.random() < 0.5:
+			layers["dns"]["dns.resp.name"] = domain
+	elif kind < 0.45:
+		layers["frame"]["frame.protocols"] = "eth:ethertype:ip:tcp:http"
+		layers["tcp"] = {"tcp.srcport": str(rng.randrange(49152, 65536)), "tcp.dstport": "80"}
+		layers["http"] = {"http.host": rng.choice(profile.domains) if rng.random() < 0.6 else rng.choice(SHARED_DOMAINS),
+				"http.request.method": "GET"}
+	else:
+		layers["frame"]["frame.protocols"] = "eth:ethertype:ip:tcp"
+		layers["tcp"] = {"tcp.srcport": str(rng.randrange(49152, 65536)), "tcp.dstport": rng.choice(["443", "80", "445"])}
+	return {"_index": "packets-2020-06-01", "_type": "doc", "_score": None, "_source": {"layers": layers}}
+
+def write_json(path, profile, rng, size):
+	# the tshark -T json layout, written one packet at a time
+	with open(path, 'w') as f:
+		f.write("[\n")
+		time = START_TIME
+		number = 0
+		while f.tell() < size:
+			time += rng.expovariate(50.0)
+			number += 1
+			text = json.dumps(packet(profile, rng, number, time), indent=2)
+			f.write((",\n  " if number > 1 else "  ") + text.replace("\n", "\n  "))
+		f.write("\n]\n")
+
+def generate(args):
+	size = parse_size(args.size)
+	makedirs(args.output, exist_ok=True)
+	profiles = [Profile(person, args.seed) for person in range(1, args.persons + 1)]
+	labels = []
+	for num in range(args.persons * args.cases):
+		profile = profiles[num % args.persons]
+		name = "case{:03d}".format(num + 1)
+		directory = join(args.output, name)
+		makedirs(directory, exist_ok=True)
+		rng = random.Random("{}:case:{}".format(args.seed, num))
+		write_json(join(directory, "Wireshark.json"), profile, rng, int(size * 0.8))
+		write_xml(join(directory, "Security.xml"), profile, rng, int(size * 0.1),
+				profile.security, SECURITY_EVENTS, "Microsoft-Windows-Security-Auditing")
+		write_xml(join(directory, "Sysmon.xml"), profile, rng, int(size * 0.1),
+				profile.sysmon, SYSMON_EVENTS, "Microsoft-Windows-Sysmon")
+		labels.append((name, profile.person))
+		print("{}: person {}".format(name, profile.person))
+	with open(join(args.output, "labels.csv"), 'w') as f:
+		for name, person in labels:
+			f.write("{},{}\n".format(name, person))
+
+if __name__ == "__main__":
+
+	parser = ArgumentParser()
+	parser.add_argument("output", help="directory of the generated test cases")
+	parser.add_argument("--persons", type=int, default=3, help="number of persons (classes)")
+	parser.add_argument("--cases", type=int, default=2, help="test cases per person")
+	parser.add_argument("--size", default="1MB", help="bytes per test case, e.g. 1MB, 500MB, 10GB")
+	parser.add_argument("--seed", type=int, default=0, help="the same seed writes the same dataset")
+	args = parser.parse_args()
+
+	generate(args)
@@ -0,0 +1,313 @@
+from argparse import ArgumentParser
+from os import listdir
+from os.path import isfile, join
+import hashlib
+import mmap
+import struct
+import sys
+from os import replace, stat
+from array import array
+from field_index import build_index
+
+# field_value_dict compiled into one file:
+#   header | exact table | index table
+# and each table is
+#   key offsets | key blob | row pointers | persons | counts | totals
+# keys are sorted so lookups are a binary search straight on the mapping,
+# the count matrix is stored as CSR (one sparse row per key). The index
+# table is field_index.build_index of the rows (suffix rules and per
+# suffix / network sums), so no trie is built when a model is opened.
+MAGIC = b"FVDB"
+VERSION = 2
+HEADER = struct.Struct("<4sII20sQ")
+TABLE = struct.Struct("<II6Q")
+STAMP_OFFSET = 32
+
+def parse_counts(cells):
+	# Rows are either dense "c1,...,cN,total" or sparse "person:count,..."
+	counts = {}
+	if any(':' in c for c in cells):
+		for c in cells:
+			if c:
+				person, count = c.split(':')
+				counts[int(person)] = counts.get(int(person), 0) + int(count)
+	else:
+		for i, c in enumerate(cells[:-1]):
+			if c and int(c) != 0:
+				counts[i+1] = int(c)
+	return counts
+
+def source_checksum(directory):
+	sha = hashlib.sha1()
+	for csv in sorted(listdir(directory)):
+		sha.update(csv.encode("utf-8") + b"\0")
+		with open(join(directory, csv), 'rb') as f:
+			sha.update(f.read())
+	return sha.digest()
+
+def read_csv_dir(directory):
+	# duplicate keys are summed, they only come from hand edited tables
+	rows = {}
+	duplicate = 0
+	for csv in sorted(listdir(directory)):
+		with open(join(directory, csv), 'r') as f:
+			for l in f:
+				arr = l.rstrip('\n').split(',')
+				if not arr[0]:
+					continue
+				counts = parse_counts(arr[1:])
+				if arr[0] in rows:
+					duplicate += 1
+					for person, count in counts.items():
+						rows[arr[0]][person] = rows[arr[0]].get(person, 0) + count
+				else:
+					rows[arr[0]] = counts
+	return rows, duplicate
+
+def source_stamp(directory):
+	# changes whenever a table is added, removed or written
+	stamps = [stat(directory).st_mtime_ns]
+	for csv in listdir(directory):
+		stamps.append(stat(join(directory, csv)).st_mtime_ns)
+	return max(stamps)
+
+def table_sections(rows, totals=None):
+	keys = sorted(rows, key=lambda k: k.encode("utf-8"))
+	key_offsets = array('I', [0])
+	key_blob = bytearray()
+	row_ptr = array('I', [0])
+	persons = array('I')
+	counts = array('I')
+	row_totals = array('I')
+
+	for key in keys:
+		key_blob += key.encode("utf-8")
+		key_offsets.append(len(key_blob))
+		for person in sorted(rows[key]):
+			persons.append(person)
+			counts.append(rows[key][person])
+		row_ptr.append(len(persons))
+		row_totals.append(totals[key] if totals is not None else sum(rows[key].values()))
+
+	while len(key_blob) % 4:
+		key_blob.append(0)
+	return len(keys), len(persons), [key_offsets, key_blob, row_ptr, persons, counts, row_totals]
+
+def write_model(rows, path, checksum=b"\0" * 20, index=None, stamp=0):
+	# index: key -> (counts, total), build_index(rows) when not given
+	if index is None:
+		index = build_index(rows)
+	class_num = max((max(counts) for counts in rows.values() if counts), default=0)
+	tables = [table_sections(rows),
+			table_sections({key: counts for key, (counts, total) in index.items()},
+					{key: total for key, (counts, total) in index.items()})]
+
+	pos = HEADER.size + TABLE.size * len(tables)
+	headers = []
+	for key_count, nnz, sections in tables:
+		offsets = []
+		for section in sections:
+			offsets.append(pos)
+			pos += len(section) * (section.itemsize if isinstance(section, array) else 1)
+		headers.append(TABLE.pack(key_count, nnz, *offsets))
+
+	# written next to the model and renamed over it, processes that still map
+	# the old file keep reading it and nobody sees a half written one
+	with open(path + ".tmp", 'wb') as f:
+		f.write(HEADER.pack(MAGIC, VERSION, class_num, checksum, stamp))
+		for header in headers:
+			f.write(header)
+		for key_count, nnz, sections in tables:
+			for section in sections:
+				if isinstance(section, array):
+					if sys.byteorder != "little":
+						section.byteswap()
+					section = section.tobytes()
+				f.write(section)
+	replace(path + ".tmp", path)
+
+def compile_model(directory, path, stamped=True):
+	stamp = source_stamp(directory) if stamped else 0
+	rows, duplicate = read_csv_dir(directory)
+	if duplicate:
+		print("{} duplicate headers merged".format(duplicate))
+	index = build_index(rows)
+	write_model(rows, path, source_checksum(directory), index, stamp)
+	return len(rows), len(index)
+
+def section(view, offset, length):
+	if sys.byteorder == "little":
+		return view[offset:offset + length * 4].cast('I')
+	res = array('I', view[offset:offset + length * 4])
+	res.byteswap()
+	return res
+
+class Table:
+	def __init__(self, view, key_count, nnz, offsets):
+		n = self.key_count = key_count
+		ends = [offsets[0] + (n + 1) * 4, offsets[2], offsets[2] + (n + 1) * 4,
+				offsets[3] + nnz * 4, offsets[4] + nnz * 4, offsets[5] + n * 4]
+		if offsets[1] > offsets[2] or any(end > len(view) for end in ends):
+			raise ValueError("table runs past the end of the file")
+		self.key_offsets = section(view, offsets[0], n + 1)
+		self.key_blob = view[offsets[1]:offsets[2]]
+		self.row_ptr = section(view, offsets[2], n + 1)
+		self.persons = section(view, offsets[3], nnz)
+		self.counts = section(view, offsets[4], nnz)
+		self.totals = section(view, offsets[5], n)
+
+	def release(self):
+		for part in (self.key_offsets, self.key_blob, self.row_ptr, self.persons, self.counts, self.totals):
+			if isinstance(part, memoryview):
+				part.release()
+
+	def key(self, i):
+		return bytes(self.key_blob[self.key_offsets[i]:self.key_offsets[i+1]])
+
+	def find(self, key):
+		target = key.encode("utf-8")
+		lo, hi = 0, self.key_count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.key(mid) < target:
+				lo = mid + 1
+			else:
+				hi = mid
+		if lo < self.key_count and self.key(lo) == target:
+			return lo
+		return -1
+
+	def row(self, i):
+		start, end = self.row_ptr[i], self.row_ptr[i+1]
+		return {self.persons[j]: self.counts[j] for j in range(start, end)}
+
+	def entry(self, key):
+		i = self.find(key)
+		if i < 0:
+			return None
+		return self.row(i), self.totals[i]
+
+	def items(self):
+		for i in range(self.key_count):
+			yield self.key(i).decode("utf-8"), self.row(i)
+
+class Model:
+	def __init__(self, path):
+		self.path = path
+		self.open()
+
+	def open(self):
+		with open(self.path, 'rb') as f:
+			self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if len(self.mm) < HEADER.size or self.mm[:4] != MAGIC or \
+				HEADER.unpack_from(self.mm, 0)[1] != VERSION:
+			self.mm.close()
+			raise ValueError("{} is not a version {} field_value_dict model".format(self.path, VERSION))
+		magic, version, self.class_num, self.checksum, self.stamp = HEADER.unpack_from(self.mm, 0)
+		self.view = memoryview(self.mm)
+		tables = []
+		try:
+			if len(self.mm) < HEADER.size + TABLE.size * 2:
+				raise ValueError("table headers cut off")
+			for i in range(2):
+				key_count, nnz, *offsets = TABLE.unpack_from(self.mm, HEADER.size + TABLE.size * i)
+				tables.append(Table(self.view, key_count, nnz, offsets))
+		except ValueError as e:
+			# a truncated or damaged file, open_model compiles it again
+			for table in tables:
+				table.release()
+			self.view.release()
+			self.mm.close()
+			raise ValueError("{} is damaged: {}".format(self.path, e))
+		self.exact, self.index = tables
+		self.key_count = self.exact.key_count
+
+	def close(self):
+		self.exact.release()
+		self.index.release()
+		self.view.release()
+		self.mm.close()
+
+	# processes get the path and map the same file again instead of a copy
+	def __getstate__(self):
+		return {"path": self.path}
+
+	def __setstate__(self, state):
+		self.path = state["path"]
+		self.open()
+
+	def is_stale(self, directory):
+		return self.checksum != source_checksum(directory)
+
+	def find(self, key):
+		return self.exact.find(key)
+
+	def get(self, key, default=None):
+		i = self.exact.find(key)
+		if i < 0:
+			return default
+		return self.exact.row(i)
+
+	def total(self, key):
+		i = self.exact.find(key)
+		return self.exact.totals[i] if i >= 0 else 0
+
+	def index_entry(self, key):
+		# field_index.lookup reads the compiled index through this
+		return self.index.entry(key)
+
+	def __contains__(self, key):
+		return self.exact.find(key) >= 0
+
+	def __getitem__(self, key):
+		i = self.exact.find(key)
+		if i < 0:
+			raise KeyError(key)
+		return self.exact.row(i)
+
+	def __len__(self):
+		return self.key_count
+
+	def items(self):
+		return self.exact.items()
+
+def set_stamp(path, stamp):
+	# a copy with the new stamp replaces the model, like write_model
+	with open(path, 'rb') as f:
+		data = bytearray(f.read())
+	struct.pack_into("<Q", data, STAMP_OFFSET, stamp)
+	with open(path + ".tmp", 'wb') as f:
+		f.write(data)
+	replace(path + ".tmp", path)
+
+def open_model(directory, path):
+	# the csv tables are only hashed again when their mtimes changed, and the
+	# model is rebuilt when their content changed since the last compile
+	if isfile(path):
+		try:
+			model = Model(path)
+		except ValueError:
+			model = None
+		if model is not None:
+			stamp = source_stamp(directory)
+			if model.stamp == stamp:
+				return model
+			if not model.is_stale(directory):
+				model.close()
+				set_stamp(path, stamp)
+				return Model(path)
+			print("{} is stale, recompiling".format(path))
+			model.close()
+		else:
+			print("{} is an old or damaged model, recompiling".format(path))
+	compile_model(directory, path)
+	return Model(path)
+
+if __name__ == "__main__":
+
+	parser = ArgumentParser()
+	parser.add_argument("directory", help="field_value_dict directory of csv tables")
+	parser.add_argument("output", help="compiled model file")
+	args = parser.parse_args()
+
+	print("{} keys, {} index entries written to {}".format(*compile_model(args.directory, args.output), args.output))
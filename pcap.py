@@ -0,0 +1,307 @@
+import struct
+import time
+
+# Streams pcap / pcapng captures into the same packet layout tshark -T json
+# writes ({"_source": {"layers": {...}}}), decoding only the layers and fields
+# the predictors and statistics look at. All values are strings like tshark's.
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_OLD = 12
+LINKTYPE_LINUX_SLL = 113
+
+PCAP_MAGIC = {
+		b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+		b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+		b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+		b"\xa1\xb2\x3c\x4d": (">", 1e-9)}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+UDP_APPS = {53: "dns", 5353: "mdns", 67: "dhcp", 68: "dhcp", 123: "ntp",
+		137: "nbns", 546: "dhcpv6", 547: "dhcpv6"}
+DNS_TYPES = {1: "A", 2: "NS", 5: "CNAME", 6: "SOA", 12: "PTR", 15: "MX", 16: "TXT",
+		28: "AAAA", 33: "SRV", 41: "OPT", 64: "SVCB", 65: "HTTPS"}
+# record types whose data is one domain name: field, label in the record text
+DNS_NAME_DATA = {2: ("dns.ns", "ns "), 5: ("dns.cname", "cname "), 12: ("dns.ptr.domain_name", "")}
+HTTP_METHODS = (b"GET ", b"POST ", b"HEAD ", b"PUT ", b"DELETE ", b"OPTIONS ",
+		b"CONNECT ", b"PATCH ", b"TRACE ")
+
+def read_records(f):
+	# yields (timestamp, linktype, packet bytes)
+	magic = f.read(4)
+	if magic == PCAPNG_SHB:
+		yield from read_pcapng(f, magic)
+	elif magic in PCAP_MAGIC:
+		yield from read_pcap(f, magic)
+	else:
+		raise ValueError("not a pcap or pcapng file")
+
+def read_pcap(f, magic):
+	endian, resolution = PCAP_MAGIC[magic]
+	header = f.read(20)
+	linktype = struct.unpack(endian + "HHiIII", header)[5] & 0xffff
+	record = struct.Struct(endian + "IIII")
+	while True:
+		head = f.read(record.size)
+		if len(head) < record.size:
+			return
+		sec, frac, caplen, origlen = record.unpack(head)
+		data = f.read(caplen)
+		if len(data) < caplen:
+			return
+		yield sec + frac * resolution, linktype, data
+
+def read_pcapng(f, magic):
+	endian = "<"
+	interfaces = []
+	while True:
+		if magic is None:
+			magic = f.read(4)
+		if len(magic) < 4:
+			return
+		head = f.read(4)
+		if len(head) < 4:
+			return
+
+		if magic == PCAPNG_SHB:
+			bom = f.read(4)
+			endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+			interfaces = []
+			block_len = struct.unpack(endian + "I", head)[0]
+			body = f.read(block_len - 12)
+			magic = None
+			continue
+
+		block_type = struct.unpack(endian + "I", magic)[0]
+		block_len = struct.unpack(endian + "I", head)[0]
+		body = f.read(block_len - 8)
+		magic = None
+		if len(body) < block_len - 8:
+			return
+
+		if block_type == 1:
+			linktype = struct.unpack_from(endian + "H", body, 0)[0]
+			interfaces.append((linktype, if_tsresol(body[8:-4], endian)))
+		elif block_type == 6:
+			iface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", body, 0)
+			linktype, resolution = interfaces[iface]
+			yield ((ts_high << 32) | ts_low) * resolution, linktype, body[20:20 + caplen]
+		elif block_type == 3 and interfaces:
+			origlen = struct.unpack_from(endian + "I", body, 0)[0]
+			linktype = interfaces[0][0]
+			yield 0.0, linktype, body[4:4 + min(origlen, len(body) - 8)]
+
+def if_tsresol(options, endian):
+	pos = 0
+	while pos + 4 <= len(options):
+		code, length = struct.unpack_from(endian + "HH", options, pos)
+		if code == 0:
+			break
+		if code == 9 and length >= 1:
+			value = options[pos + 4]
+			if value & 0x80:
+				return 2.0 ** -(value & 0x7f)
+			return 10.0 ** -value
+		pos += 4 + (length + 3) // 4 * 4
+	return 1e-6
+
+def hex_field(value):
+	# tshark -T json writes unsigned hex fields 32 bits wide, eth.type 0x00000800
+	return "0x{:08x}".format(value)
+
+def mac(data):
+	return ":".join("{:02x}".format(b) for b in data)
+
+def ipv4(data):
+	return ".".join(str(b) for b in data)
+
+def ipv6(data):
+	groups = struct.unpack("!8H", data)
+	# shorten the longest run of zero groups like tshark does
+	best, best_len, run, run_len = -1, 1, -1, 0
+	for i, g in enumerate(groups):
+		if g == 0:
+			if run < 0:
+				run, run_len = i, 0
+			run_len += 1
+			if run_len > best_len:
+				best, best_len = run, run_len
+		else:
+			run = -1
+	parts = ["{:x}".format(g) for g in groups]
+	if best < 0:
+		return ":".join(parts)
+	return ":".join(parts[:best]) + "::" + ":".join(parts[best + best_len:])
+
+def dns_name(data, pos):
+	labels = []
+	end = None
+	for _ in range(128):
+		if pos >= len(data):
+			raise ValueError("truncated dns name")
+		length = data[pos]
+		if length & 0xc0 == 0xc0:
+			if end is None:
+				end = pos + 2
+			pos = ((length & 0x3f) << 8) | data[pos + 1]
+			continue
+		pos += 1
+		if length == 0:
+			break
+		labels.append(data[pos:pos + length].decode("latin-1"))
+		pos += length
+	name = ".".join(labels) if labels else "<Root>"
+	return name, end if end is not None else pos
+
+def dns_record_type(rtype):
+	return DNS_TYPES.get(rtype, str(rtype))
+
+def dns_class(rclass):
+	return "IN" if rclass == 1 else "0x{:04x}".format(rclass)
+
+def decode_dns(data, layers):
+	# nested per record like tshark: Queries, Answers, Authoritative
+	# nameservers and Additional records, every record has its dns.resp.name
+	layer = layers["dns"] = {}
+	ident, flags, qdcount, ancount, nscount, arcount = struct.unpack_from("!HHHHHH", data, 0)
+	layer["dns.id"] = hex_field(ident)
+	layer["dns.flags"] = hex_field(flags)
+	layer["dns.flags.response"] = str(flags >> 15)
+	layer["dns.count.queries"] = str(qdcount)
+	layer["dns.count.answers"] = str(ancount)
+	layer["dns.count.auth_rr"] = str(nscount)
+	layer["dns.count.add_rr"] = str(arcount)
+	pos = 12
+	for i in range(qdcount):
+		name, pos = dns_name(data, pos)
+		qtype, qclass = struct.unpack_from("!HH", data, pos)
+		pos += 4
+		queries = layer.setdefault("Queries", {})
+		queries["{}: type {}, class {}".format(name, dns_record_type(qtype), dns_class(qclass))] = {
+				"dns.qry.name": name, "dns.qry.type": str(qtype), "dns.qry.class": hex_field(qclass)}
+	for section, count in (("Answers", ancount), ("Authoritative nameservers", nscount),
+			("Additional records", arcount)):
+		for i in range(count):
+			name, pos = dns_name(data, pos)
+			rtype, rclass, ttl, rdlength = struct.unpack_from("!HHIH", data, pos)
+			pos += 10
+			record = {"dns.resp.name": name, "dns.resp.type": str(rtype),
+					"dns.resp.class": hex_field(rclass), "dns.resp.ttl": str(ttl), "dns.resp.len": str(rdlength)}
+			text = "{}: type {}, class {}".format(name, dns_record_type(rtype), dns_class(rclass))
+			if rtype == 1 and rdlength == 4:
+				record["dns.a"] = ipv4(data[pos:pos + 4])
+				text += ", addr " + record["dns.a"]
+			elif rtype == 28 and rdlength == 16:
+				record["dns.aaaa"] = ipv6(data[pos:pos + 16])
+				text += ", addr " + record["dns.aaaa"]
+			elif rtype in DNS_NAME_DATA:
+				field, label = DNS_NAME_DATA[rtype]
+				record[field] = dns_name(data, pos)[0]
+				text += ", " + label + record[field]
+			pos += rdlength
+			layer.setdefault(section, {})[text] = record
+
+def decode_http(payload):
+	if not (payload.startswith(HTTP_METHODS) or payload.startswith(b"HTTP/1.")):
+		return None
+	layer = {}
+	head = payload.split(b"\r\n\r\n", 1)[0].split(b"\r\n")
+	if payload.startswith(b"HTTP/1."):
+		layer["http.response"] = "1"
+	else:
+		layer["http.request"] = "1"
+		layer["http.request.method"] = head[0].split(b" ", 1)[0].decode("latin-1")
+	for line in head[1:]:
+		name, _, value = line.partition(b":")
+		if name.strip().lower() == b"host":
+			layer["http.host"] = value.strip().decode("latin-1")
+	return layer
+
+def decode_udp(data, layers):
+	sport, dport, length = struct.unpack_from("!HHH", data, 0)
+	layers["udp"] = {"udp.srcport": str(sport), "udp.dstport": str(dport), "udp.length": str(length)}
+	payload = data[8:]
+	app = UDP_APPS.get(sport) or UDP_APPS.get(dport)
+	if app == "dns":
+		decode_dns(payload, layers)
+	elif app is not None:
+		layers[app] = {}
+	elif payload:
+		layers["data"] = {"data.len": str(len(payload))}
+
+def decode_tcp(data, layers):
+	sport, dport, seq, ack, offset_flags = struct.unpack_from("!HHIIH", data, 0)
+	layers["tcp"] = {"tcp.srcport": str(sport), "tcp.dstport": str(dport),
+			"tcp.seq_raw": str(seq), "tcp.flags": hex_field(offset_flags & 0x1ff)}
+	payload = data[(offset_flags >> 12) * 4:]
+	if not payload:
+		return
+	if sport == 53 or dport == 53:
+		decode_dns(payload[2:], layers)
+		return
+	http = decode_http(payload)
+	if http is not None:
+		layers["http"] = http
+	elif payload[0] in (0x14, 0x15, 0x16, 0x17) and payload[1:2] == b"\x03":
+		layers["tls"] = {}
+	else:
+		layers["data"] = {"data.len": str(len(payload))}
+
+def decode_transport(proto, data, layers):
+	if proto == 17:
+		decode_udp(data, layers)
+	elif proto == 6:
+		decode_tcp(data, layers)
+
+def decode_ip(data, layers):
+	version = data[0] >> 4
+	if version == 4:
+		ihl = (data[0] & 0x0f) * 4
+		total_len, frag, ttl, proto = struct.unpack_from("!H2xHBB", data, 2)
+		layers["ip"] = {"ip.src": ipv4(data[12:16]), "ip.dst": ipv4(data[16:20]),
+				"ip.proto": str(proto), "ip.ttl": str(ttl), "ip.len": str(total_len)}
+		if frag & 0x1fff == 0:
+			decode_transport(proto, data[ihl:total_len or None], layers)
+	elif version == 6:
+		payload_len, proto = struct.unpack_from("!HB", data, 4)
+		layers["ipv6"] = {"ipv6.src": ipv6(data[8:24]), "ipv6.dst": ipv6(data[24:40]),
+				"ipv6.nxt": str(proto)}
+		decode_transport(proto, data[40:40 + payload_len], layers)
+
+def decode_ethertype(ethertype, data, layers):
+	if ethertype in (0x0800, 0x86dd):
+		decode_ip(data, layers)
+	elif ethertype == 0x0806:
+		layers["arp"] = {"arp.src.proto_ipv4": ipv4(data[14:18]), "arp.dst.proto_ipv4": ipv4(data[24:28])}
+
+def decode_packet(number, timestamp, linktype, data):
+	layers = {"frame": {
+			"frame.time": time.strftime("%b %d, %Y %H:%M:%S", time.localtime(timestamp)) +
+				".{:09d}".format(int(round(timestamp % 1 * 1e9)) % 1000000000),
+			"frame.time_epoch": "{:.9f}".format(timestamp),
+			"frame.number": str(number),
+			"frame.len": str(len(data))}}
+	try:
+		if linktype == LINKTYPE_ETHERNET:
+			ethertype = struct.unpack_from("!H", data, 12)[0]
+			layers["eth"] = {"eth.dst": mac(data[0:6]), "eth.src": mac(data[6:12]),
+					"eth.type": hex_field(ethertype)}
+			pos = 14
+			while ethertype in (0x8100, 0x88a8):
+				ethertype = struct.unpack_from("!H", data, pos + 2)[0]
+				layers["vlan"] = {"vlan.etype": hex_field(ethertype)}
+				pos += 4
+			decode_ethertype(ethertype, data[pos:], layers)
+		elif linktype == LINKTYPE_LINUX_SLL:
+			decode_ethertype(struct.unpack_from("!H", data, 14)[0], data[16:], layers)
+		elif linktype in (LINKTYPE_RAW, LINKTYPE_RAW_OLD):
+			decode_ip(data, layers)
+	except (struct.error, IndexError, ValueError):
+		# truncated or malformed, keep whatever decoded before the error
+		pass
+	return {"_source": {"layers": layers}}
+
+def iter_packets(path):
+	with open(path, 'rb') as f:
+		for number, (timestamp, linktype, data) in enumerate(read_records(f), 1):
+			yield decode_packet(number, timestamp, linktype, data)
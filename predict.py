@@ -4,12 +4,25 @@ from os.path import isfile, isdir, join
 import pickle
 import json
 import gc
+import random
+import hashlib
 import pprint
 import multiprocessing as mp
-import xlwings as xw
-from xlwings import Range, constants
+import pcap
+import evtx
+try:
+	import xlwings as xw
+	from xlwings import Range, constants
+except ImportError:
+	# only statistics.xlsx needs Excel, --tables works without it
+	xw = None
 import operator
-import random
+from field_index import build_index, lookup
+from model import Model, open_model, read_csv_dir, source_checksum
+from result_cache import ResultCache, file_sha1
+from window import windows, system_time
+from features import build_partial, capture_features, OBSERVED_PROTOCOL_FIELD, VERSION as FEATURES_VERSION
+from datetime import datetime, timezone
 try:
 	import xml.etree.cElementTree as ET
 except ImportError:
@@ -71,6 +84,18 @@ class LogXml(Log):
 		dfs(first_event, 1)
 		print(elem_str(first_event, 0)[1])
 
+class LogEvtx(LogXml):
+	def __init__(self, name, path):
+		super().__init__(name, path)
+		self.type = "evtx"
+
+	def load(self):
+		# same compact tree as the xml export, read from the binary log
+		self.root = evtx.build_tree(self.records())
+
+	def records(self):
+		return evtx.iter_records(self.path)
+
 class LogJson(Log):
 	def __init__(self, name, path):
 		super().__init__()
@@ -92,6 +117,25 @@ class LogJson(Log):
 		print("{}.{} Tree Structure".format(self.name, self.type))
 		pprint.pprint(self.data[0])
 
+class LogPcap(Log):
+	def __init__(self, name, path):
+		super().__init__()
+		self.type = "pcap"
+		self.name = name
+		self.path = path
+
+	def load(self):
+		self.data = list(self.packets())
+
+	def packets(self):
+		# streamed straight from the capture, no tshark json round trip
+		return pcap.iter_packets(self.path)
+
+	def show(self, tag):
+		for elem in self.packets():
+			frame = elem["_source"]["layers"]["frame"]
+			print("Wireshark frame.time: "+frame["frame.time"])
+
 class TestCase:
 	def __init__(self, name, path):
 		self.path = path
@@ -111,6 +155,17 @@ class TestCase:
 		else:
 			print("Unknown xml file name...")
 
+	def load_evtx(self, file_name):
+		if file_name == "Security.evtx":
+			log = LogEvtx("Security", join(self.path, file_name))
+			self.security_log = log
+
+		elif file_name == "Sysmon.evtx":
+			log = LogEvtx("Sysmon", join(self.path, file_name))
+			self.sysmon_log = log
+		else:
+			print("Unknown evtx file name...")
+
 	def load_json(self, file_name):
 		if file_name == "Wireshark.json":
 			log = LogJson("Wireshark", join(self.path, file_name))
@@ -118,6 +173,13 @@ class TestCase:
 		else:
 			print("Unknown json file name...")
 
+	def load_pcap(self, file_name):
+		if file_name in ("Wireshark.pcap", "Wireshark.pcapng"):
+			log = LogPcap("Wireshark", join(self.path, file_name))
+			self.wireshark_log = log
+		else:
+			print("Unknown pcap file name...")
+
 
 class DataLoader:
 
@@ -127,10 +189,16 @@ class DataLoader:
 	def check_ext(self, file_name, testcase):
 		if file_name.endswith("xml"):
 			testcase.load_xml(file_name)
+		elif file_name.endswith("evtx"):
+			testcase.load_evtx(file_name)
 		elif file_name.endswith("json"):
 			testcase.load_json(file_name)
+		elif file_name.endswith("pcap") or file_name.endswith("pcapng"):
+			testcase.load_pcap(file_name)
+		elif file_name.endswith(".features"):
+			pass
 		else:
-			print("Only for xml or json...")
+			print("Only for xml, evtx, json or pcap...")
 
 	def load_testcase_directory(self):
 		print("deprecated")
@@ -159,93 +227,185 @@ class DataLoader:
 		return testcase
 
 	def __iter__(self):
-		for testcase in listdir(self.path):
-			yield self.load_testcase(testcase)
+		# name order, the same test case numbering as train.py on every platform
+		for testcase in sorted(listdir(self.path)):
+			if isdir(join(self.path, testcase)):
+				yield self.load_testcase(testcase)
+
+def best_person(counts):
+	# highest count, lowest person index on ties
+	return max(counts, key=lambda person: (counts[person], -person))
 
 class Predictor:
+	# bump when a change to the prediction code changes its answers
+	version = 1
+
 	def __init__(self): None
 	def load(self, directory): None
 	def predict(self, log): None
+	def model_hash(self): None
 
 class WiresharkPredictor(Predictor):
-	def __init__(self):
+	def __init__(self, suffix_match=True):
 		self.protocol_field = {}
-		self.observed_protocol_field = {
-				"http": ["http.host"],
-				"dns": ["dns.qry.name","dns.resp.name"],
-				"ip":["ip.src","ip.dst"]}
+		self.index_entry = {}.get
+		self.suffix_match = suffix_match
+		self.class_num = 0
+		self.checksum = None
+		self.observed_protocol_field = {proto: list(fields)
+				for proto, fields in OBSERVED_PROTOCOL_FIELD.items()}
 
 	def load(self, directory):
-		for csv in listdir(directory):
-			with open(join(directory, csv), 'r') as f:
-				for l in f:
-					arr = l.split(',')
-					if arr[0] in self.protocol_field:
-						print("Duplicate header")
-					self.protocol_field[arr[0]] = arr[1:-1]
+		if not isdir(directory):
+			self.load_model(Model(directory))
+			return
+
+		self.checksum = source_checksum(directory)
+		self.protocol_field, duplicate = read_csv_dir(directory)
+		if duplicate:
+			print("{} duplicate headers".format(duplicate))
+		self.index_entry = build_index(self.protocol_field).get
+		self.class_num = max((max(counts) for counts in self.protocol_field.values() if counts), default=0)
+
+	def load_model(self, model):
+		# exact hits and the suffix/prefix index are both read from the mapped model
+		self.protocol_field = model
+		self.index_entry = model.index_entry
+		self.class_num = model.class_num
+		self.checksum = model.checksum if any(model.checksum) else bytes.fromhex(file_sha1(model.path))
+
+	def model_hash(self):
+		# the csv tables, plus the options and features that change the answers
+		config = (self.suffix_match, sorted(self.observed_protocol_field.items()), FEATURES_VERSION)
+		return hashlib.sha1(self.checksum + repr(config).encode("utf-8")).hexdigest()
 
 	def predict(self, data):
-		field_count = self.extract(data)
+		return self.predict_conf(data)[0]
 
-		score = [0] * 6
-
-		for field in field_count:
-			if field in self.protocol_field:
-				for i in range(len(self.protocol_field[field])):
-					score[i] += int(self.protocol_field[field][i])
+	def predict_conf(self, data):
+		return self.predict_fields(self.extract(data))
 
-		max_val = 0
-		res_idx = 1
-		for i in range(6):
-			if max_val < score[i]:
-				res_idx = i + 1
-				max_val = score[i]
-		#print(max_val)
-		return res_idx
+	def predict_fields(self, field_count):
+		# sparse accumulation, only over matched fields and their non-zero persons
+		score = {}
 
+		for field in field_count:
+			counts = self.protocol_field.get(field)
+			if counts is None:
+				# domain/suffix and longest prefix match, O(label count)
+				# exact hits always count, --exact-match only drops the fallback
+				if not self.suffix_match:
+					continue
+				counts = lookup(self.index_entry, field)
+				if counts is None:
+					continue
+			for person, count in counts.items():
+				score[person] = score.get(person, 0) + count
+
+		total = sum(score.values())
+		if total == 0:
+			return [0, 0]
+		res_idx = best_person(score)
+		return [res_idx, score[res_idx]/total]
 
 	def extract(self, data):
+		# the same nested field walk as the statistics and the feature cache
+		return build_partial(data).fields(self.observed_protocol_field)
+
+	def events(self, data):
+		return build_partial(data).events(self.observed_protocol_field)
 
-		field_count = {}
+	def predict_window(self, counts):
+		return self.predict_fields(counts)
 
-		def extract_single(d):
-			for proto in self.observed_protocol_field:
-				if proto in d['_source']['layers']:
-					field_count[proto] = 1
-					for field in self.observed_protocol_field[proto]:
-						if field in d['_source']['layers'][proto]:
-							key = d['_source']['layers'][proto][field] + '@' + field
-							field_count[key] = 1
+	def extract_features(self, features):
+		return features.fields(self.observed_protocol_field)
 
-		for d in data:
-			extract_single(d)
+	def feature_events(self, features):
+		return features.events(self.observed_protocol_field)
 
-		return field_count
+class XmlPredictor(Predictor):
+	sheet_name = None
 
-class SecurityPredictor(Predictor):
 	def __init__(self):
 		self.sheet = None
+		self.table = {}
+		self.class_num = 0
 
 	def load(self, workbook):
-		sheet = workbook.sheets["Security"]
+		sheet = workbook.sheets[self.sheet_name]
 		self.sheet = sheet
-		
-	def compute(self, target, start, end):
+		self.load_rows(sheet.used_range.value)
+
+	def load_rows(self, rows):
+		# Blocks of "<tag>, Person1, ..., PersonN[, Total]" followed by value rows,
+		# or of "<tag>" followed by sparse "value, person:count, ..." rows
+		tag = None
+		persons = {}
+		total_col = None
+		for row in rows:
+			if row[0] is None:
+				continue
+			if isinstance(row[0], str):
+				tag = row[0]
+				persons = {}
+				total_col = None
+				for j, cell in enumerate(row[1:], 1):
+					if isinstance(cell, str) and cell.startswith("Person"):
+						persons[j] = int(cell[len("Person"):])
+					elif cell == "Total":
+						total_col = j
+				self.table[tag] = {}
+				if persons:
+					self.class_num = max(self.class_num, max(persons.values()))
+				continue
+			counts = {}
+			for j, person in persons.items():
+				if j < len(row) and row[j]:
+					counts[person] = int(row[j])
+			if not persons:
+				for cell in row[1:]:
+					if isinstance(cell, str) and ':' in cell:
+						person, count = cell.split(':')
+						counts[int(person)] = int(count)
+				if counts:
+					self.class_num = max(self.class_num, max(counts))
+			if total_col is not None and row[total_col]:
+				total = row[total_col]
+			else:
+				total = sum(counts.values())
+			self.table[tag][float(row[0])] = (counts, total)
+
+	def model_hash(self):
+		table = sorted((tag, sorted((value, sorted(counts.items()), total)
+				for value, (counts, total) in values.items())) for tag, values in self.table.items())
+		return hashlib.sha1(repr(table).encode("utf-8")).hexdigest()
+
+	def compute(self, target, tag):
 		pred = [0, 0]
-		for i in range(start, end):
-			#print(self.sheet.cells(i, 'A').value)
-			if self.sheet.cells(i, 'A').value == target:
-				tmpMax = 0
-				for j in range(2, 8):
-					#print(self.sheet.cells(i, j).value)
-					if self.sheet.cells(i, j).value > tmpMax:
-						tmpMax = self.sheet.cells(i, j).value
-						#print(tmpMax)
-						pred = [j-1, tmpMax/self.sheet.cells(i, 8).value]
-				break
+		if target in self.table.get(tag, {}):
+			counts, total = self.table[tag][target]
+			if counts and total:
+				person = best_person(counts)
+				pred = [person, counts[person]/total]
 		return pred
-		
+
+	def load_csv(self, path):
+		# the same block layout as the sheet, as written by train.py
+		rows = []
+		with open(path, 'r') as f:
+			for l in f:
+				arr = l.rstrip('\n').split(',')
+				try:
+					rows.append([float(arr[0])] + [c if ':' in c else float(c) if c else None for c in arr[1:]])
+				except ValueError:
+					rows.append(arr)
+		self.load_rows(rows)
+
 	def predict(self, data):
+		return self.predict_conf(data)[0]
+
+	def predict_conf(self, data):
 		for elem in data:
 			xmlns = elem.tag.split("}")[0] + "}"
 		dicProcessID = {}
@@ -270,15 +430,18 @@ class SecurityPredictor(Predictor):
 				dicTask[res.text] +=1
 			else:
 				dicTask.update(tmpDic)
-		ProcessID =  max(dicProcessID.items(), key=operator.itemgetter(1))[0]
-		EventID = max(dicEventID.items(), key=operator.itemgetter(1))[0]
-		Task = max(dicTask.items(), key=operator.itemgetter(1))[0]
-		#print(ProcessID)
-		#print(EventID)
-		#print(Task)
-		ProcessIDp = self.compute(float(ProcessID), 28, 34)
-		EventIDp = self.compute(float(EventID), 3, 17)
-		Taskp = self.compute(float(Task), 18, 27)
+		return self.predict_counts(dicProcessID, dicEventID, dicTask)
+
+	def predict_counts(self, dicProcessID, dicEventID, dicTask):
+		def most_common(dic, tag):
+			if not dic:
+				return [0, 0]
+			value = max(dic.items(), key=operator.itemgetter(1))[0]
+			return self.compute(float(value), tag)
+
+		ProcessIDp = most_common(dicProcessID, "ProcessID")
+		EventIDp = most_common(dicEventID, "EventID")
+		Taskp = most_common(dicTask, "Task")
 		#print(ProcessIDp)
 		#print(EventIDp)
 		#print(Taskp)
@@ -287,106 +450,221 @@ class SecurityPredictor(Predictor):
 		#print(maxP)
 		idx = [i for i, j in enumerate(resList[1::2]) if j == maxP][0]*2
 		#print(idx)
-		res = resList[idx]
-		return res
-		
-class SysmonPredictor(Predictor):
-	def __init__(self):
-		self.sheet = None
+		return [resList[idx], maxP]
 
-	def load(self, workbook):
-		sheet = workbook.sheets["Sysmon"]
-		self.sheet = sheet
-		
-	def compute(self, target, start, end):
-		pred = [0, 0]
-		for i in range(start, end):
-			#print(self.sheet.cells(i, 'A').value)
-			if self.sheet.cells(i, 'A').value == target:
-				tmpMax = 0
-				for j in range(2, 8):
-					#print(self.sheet.cells(i, j).value)
-					if self.sheet.cells(i, j).value > tmpMax:
-						tmpMax = self.sheet.cells(i, j).value
-						#print(tmpMax)
-						pred = [j-1, tmpMax/self.sheet.cells(i, 8).value]
-				break
-		return pred
-		
-	def predict(self, data):
+	def events(self, data):
+		# (time, keys) per event, exports list the newest event first
 		for elem in data:
 			xmlns = elem.tag.split("}")[0] + "}"
-		dicProcessID = {}
-		dicEventID = {}
-		dicTask = {}
-		for res in data.iter(xmlns+"Execution"):
-			tmpDic = {res.attrib['ProcessID'] : 1}
-			if res.attrib['ProcessID'] in dicProcessID:
-				dicProcessID[res.attrib['ProcessID']] +=1
-			else:
-				dicProcessID.update(tmpDic)
-			#print(res.attrib['ProcessID'])
-		for res in data.iter(xmlns+"EventID"):
-			tmpDic = {res.text : 1}
-			if res.text in dicEventID:
-				dicEventID[res.text] +=1
-			else:
-				dicEventID.update(tmpDic)
-		for res in data.iter(xmlns+"Task"):
-			tmpDic = {res.text : 1}
-			if res.text in dicTask:
-				dicTask[res.text] +=1
-			else:
-				dicTask.update(tmpDic)
-		ProcessID =  max(dicProcessID.items(), key=operator.itemgetter(1))[0]
-		EventID = max(dicEventID.items(), key=operator.itemgetter(1))[0]
-		Task = max(dicTask.items(), key=operator.itemgetter(1))[0]
-		#print(ProcessID)
-		#print(EventID)
-		#print(Task)
-		ProcessIDp = self.compute(float(ProcessID), 25, 31)
-		EventIDp = self.compute(float(EventID), 3, 13)
-		Taskp = self.compute(float(Task), 14, 24)
-		#print(ProcessIDp)
-		#print(EventIDp)
-		#print(Taskp)
-		resList = ProcessIDp + EventIDp + Taskp
-		maxP = max(resList[1::2])
-		#print(maxP)
-		idx = [i for i, j in enumerate(resList[1::2]) if j == maxP][0]*2
-		#print(idx)
-		res = resList[idx]
+		events = []
+		for system in data.iter(xmlns+"System"):
+			created = system.find(xmlns+"TimeCreated")
+			if created is None:
+				continue
+			keys = []
+			for tag in ("EventID", "Task"):
+				res = system.find(xmlns+tag)
+				if res is not None:
+					keys.append((tag, res.text))
+			res = system.find(xmlns+"Execution")
+			if res is not None:
+				keys.append(("ProcessID", res.attrib['ProcessID']))
+			events.append((system_time(created.attrib['SystemTime']), keys))
+		events.sort(key=operator.itemgetter(0))
+		return events
+
+	def predict_window(self, counts):
+		dics = {"ProcessID": {}, "EventID": {}, "Task": {}}
+		for (tag, value), count in counts.items():
+			dics[tag][value] = count
+		return self.predict_counts(dics["ProcessID"], dics["EventID"], dics["Task"])
+
+class SecurityPredictor(XmlPredictor):
+	sheet_name = "Security"
+
+class SysmonPredictor(XmlPredictor):
+	sheet_name = "Sysmon"
+
+class Ensemble:
+	def __init__(self, mode="majority", tie_break="rank", seed=None):
+		# tie_break "rank": summed confidence, then the heaviest voter, then the
+		# lowest person; "random": a seeded draw among the persons tied on votes
+		self.mode = mode
+		self.tie_break = tie_break
+		self.rng = random.Random(seed)
+		self.voters = []
+		self.results = {}
+
+	def add(self, name, predict, weight=1.0, cost=1.0):
+		# predict is called lazily, only if its vote can still change the winner
+		self.voters.append((name, predict, weight, cost))
+
+	def vote_value(self, weight, conf):
+		if self.mode == "majority":
+			return 1.0
+		if self.mode == "weighted":
+			return weight
+		return weight * conf
+
+	def leader(self, poll, conf_sum, heaviest):
+		def rank(person):
+			return (poll[person], conf_sum[person], heaviest[person], -person)
+		return sorted(poll, key=rank, reverse=True)
+
+	def vote(self):
+		# cheap predictors run first, heavy ones decide ties
+		order = sorted(self.voters, key=lambda v: (v[3], -v[2]))
+
+		remaining = sum(self.vote_value(v[2], 1.0) for v in order)
+		poll = {}
+		conf_sum = {}
+		heaviest = {}
+		self.results = {}
+
+		for name, predict, weight, cost in order:
+			person, conf = predict()
+			self.results[name] = [person, conf]
+			remaining -= self.vote_value(weight, 1.0)
+			if person == 0:
+				continue
+
+			poll[person] = poll.get(person, 0) + self.vote_value(weight, conf)
+			conf_sum[person] = conf_sum.get(person, 0) + conf
+			heaviest[person] = max(heaviest.get(person, 0), weight)
+
+			ranked = self.leader(poll, conf_sum, heaviest)
+			second = poll[ranked[1]] if len(ranked) > 1 else 0
+			if poll[ranked[0]] - second > remaining:
+				break
+
+		if not poll:
+			return 0
+		ranked = self.leader(poll, conf_sum, heaviest)
+		if self.tie_break == "random":
+			return self.rng.choice(sorted(person for person in ranked if poll[person] == poll[ranked[0]]))
+		return ranked[0]
+
+def lazy_predict(log, predictor, workers=1):
+	def run():
+		if log.type in ("json", "pcap"):
+			# the capture is walked once and its features cached next to it
+			features = capture_features(log.path, workers)
+			return predictor.predict_fields(predictor.extract_features(features))
+		log.load()
+		res = predictor.predict_conf(log.root)
+		log.root = None
+		gc.collect()
 		return res
+	return run
+
+def log_events(log, predictor, workers=1):
+	if log.type in ("json", "pcap"):
+		return predictor.feature_events(capture_features(log.path, workers))
+	log.load()
+	return predictor.events(log.root)
+
+def timeline(predictor, events, size, step=None):
+	# window start -> [person, confidence], counts are updated per event
+	res = {}
+	for start, end, counts in windows(events, size, step):
+		res[start] = predictor.predict_window(counts)
+	return res
 
 if __name__ == "__main__":
 
 	parser = ArgumentParser()
 	parser.add_argument("file_path", help="root path of data")
+	parser.add_argument("--vote", default="majority", choices=["majority", "weighted", "confidence"],
+			help="voting rule of the ensemble")
+	parser.add_argument("--weights", type=float, nargs=3, default=[1.0, 1.0, 1.0],
+			metavar=("WIRESHARK", "SECURITY", "SYSMON"), help="weight of each predictor")
+	parser.add_argument("--model", default="field_value_dict.bin",
+			help="compiled field_value_dict, rebuilt when the csv tables change")
+	parser.add_argument("--tables",
+			help="output directory of train.py, used instead of field_value_dict and statistics.xlsx")
+	parser.add_argument("--workers", type=int, default=1,
+			help="processes used to parse one Wireshark.json")
+	parser.add_argument("--window", type=float,
+			help="seconds per window, print a prediction timeline instead of one label")
+	parser.add_argument("--step", type=float,
+			help="seconds between window starts, defaults to --window (tumbling)")
+	parser.add_argument("--exact-match", action="store_true",
+			help="disable registrable domain / network fallback for unseen hosts")
+	parser.add_argument("--tie-break", default="rank", choices=["rank", "random"],
+			help="rank: deterministic order of confidence, weight and person; random: seeded draw")
+	parser.add_argument("--seed", type=int, default=0,
+			help="seed of the random tie break, the same seed gives the same answers")
+	parser.add_argument("--cache", default="prediction_cache.pkl",
+			help="results of unchanged test cases, models and predictors are reused from here")
+	parser.add_argument("--no-cache", action="store_true",
+			help="predict every test case again and leave the cache untouched")
 	args = parser.parse_args()
 
 	dataLoader = DataLoader(args.file_path)
-	workbook = xw.Book('statistics.xlsx')
-	
-	for num, testcase in enumerate(dataLoader):
-		testcase.wireshark_log.load()
-		wireshark_predictor = WiresharkPredictor()
-		wireshark_predictor.load('field_value_dict')
-		testcase.security_log.load()
-		security_predictor = SecurityPredictor()
+	workbook = None
+
+	wireshark_predictor = WiresharkPredictor(not args.exact_match)
+	security_predictor = SecurityPredictor()
+	sysmon_predictor = SysmonPredictor()
+	if args.tables:
+		wireshark_predictor.load_model(open_model(join(args.tables, 'field_value_dict'),
+				join(args.tables, 'field_value_dict.bin')))
+		security_predictor.load_csv(join(args.tables, 'Security.csv'))
+		sysmon_predictor.load_csv(join(args.tables, 'Sysmon.csv'))
+	else:
+		if xw is None:
+			raise SystemExit("xlwings is needed for statistics.xlsx, or use --tables")
+		workbook = xw.Book('statistics.xlsx')
+		wireshark_predictor.load_model(open_model('field_value_dict', args.model))
 		security_predictor.load(workbook)
-		testcase.sysmon_log.load()
-		sysmon_predictor = SysmonPredictor()
 		sysmon_predictor.load(workbook)
-		res1 = wireshark_predictor.predict(testcase.wireshark_log.data)
-		res2 = security_predictor.predict(testcase.security_log.root)
-		res3 = sysmon_predictor.predict(testcase.sysmon_log.root)
-		#print("res1: {}, res2: {}, res3: {}".format(res1, res2, res3))
-		resList = [res1, res2, res3]
-		poll = [0]*6
-		for i in range(len(resList)):
-			poll[resList[i]-1] +=1
-		maxNum = max(poll)
-		res = [i+1 for i,x in enumerate(poll) if x==maxNum]
-		#print(random.choice(res))
-		print("testcase {}: person {}".format(num+1, random.choice(res)))
-	workbook.app.kill()
\ No newline at end of file
+
+	cache = None
+	if not args.no_cache and not args.window:
+		cache = ResultCache(args.cache)
+		model_hashes = {predictor: predictor.model_hash()
+				for predictor in (wireshark_predictor, security_predictor, sysmon_predictor)}
+
+	# the cache is written once, also when a run stops early
+	try:
+		for num, testcase in enumerate(dataLoader):
+			voters = [("Wireshark", testcase.wireshark_log, wireshark_predictor, args.weights[0], 10),
+					("Security", testcase.security_log, security_predictor, args.weights[1], 1),
+					("Sysmon", testcase.sysmon_log, sysmon_predictor, args.weights[2], 1)]
+			if args.window:
+				timelines = {name: timeline(predictor, log_events(log, predictor, args.workers), args.window, args.step)
+						for name, log, predictor, weight, cost in voters}
+				for start in sorted(set().union(*timelines.values())):
+					ensemble = Ensemble(args.vote, args.tie_break, args.seed)
+					for name, log, predictor, weight, cost in voters:
+						res = timelines[name].get(start, [0, 0])
+						ensemble.add(name, lambda res=res: res, weight)
+					print("testcase {} {}: person {}".format(num+1,
+							datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+							ensemble.vote()))
+				continue
+
+			res = None
+			if cache is not None:
+				keys = [cache.key(log, predictor, model_hashes[predictor]) for name, log, predictor, weight, cost in voters]
+				vote_key = ("vote", tuple(keys), args.vote, tuple(args.weights), args.tie_break, args.seed)
+				res = cache.get(vote_key)
+			if res is None:
+				ensemble = Ensemble(args.vote, args.tie_break, args.seed)
+				for i, (name, log, predictor, weight, cost) in enumerate(voters):
+					predict = lazy_predict(log, predictor, args.workers)
+					if cache is not None:
+						predict = cache.wrap(keys[i], predict)
+					ensemble.add(name, predict, weight, cost)
+				res = ensemble.vote()
+				#print(ensemble.results)
+				if cache is not None:
+					cache.put(vote_key, res)
+			print("testcase {}: person {}".format(num+1, res))
+		if cache is not None:
+			cache.prune()
+	finally:
+		if cache is not None:
+			cache.save()
+	if workbook is not None:
+		workbook.app.kill()
@@ -0,0 +1,100 @@
+from os import replace
+from os.path import getsize, getmtime, isfile
+import hashlib
+import pickle
+
+# Predictions of unchanged test cases are reused across predict.py runs.
+# A predictor result is keyed by the content hash of its log, the predictor
+# class, its version and the hash of its loaded model, and the vote by the
+# keys of all its voters plus the voting options. Changing a log, a model or
+# a predictor changes the key, so only what it affects is computed again.
+# Content hashes are remembered per (path, size, mtime), unchanged files are
+# not read again. Entries no key of a finished run reached are dropped, so the
+# cache only holds the current test cases, models and options.
+
+VERSION = 1
+HASH_BLOCK = 1 << 20
+
+def file_sha1(path):
+	h = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(HASH_BLOCK), b""):
+			h.update(block)
+	return h.hexdigest()
+
+class ResultCache:
+	def __init__(self, path):
+		self.path = path
+		self.files = {}
+		self.results = {}
+		self.dirty = False
+		self.reached = set()
+		self.reached_files = set()
+		self.load()
+
+	def load(self):
+		if not isfile(self.path):
+			return
+		try:
+			with open(self.path, 'rb') as f:
+				cached = pickle.load(f)
+		except (pickle.UnpicklingError, EOFError, AttributeError):
+			return
+		if cached.get("version") == VERSION:
+			self.files = cached["files"]
+			self.results = cached["results"]
+
+	def save(self):
+		if not self.dirty:
+			return
+		try:
+			with open(self.path + ".tmp", 'wb') as f:
+				pickle.dump({"version": VERSION, "files": self.files, "results": self.results}, f,
+						protocol=pickle.HIGHEST_PROTOCOL)
+			replace(self.path + ".tmp", self.path)
+			self.dirty = False
+		except OSError:
+			print("Cannot write result cache {}".format(self.path))
+
+	def prune(self):
+		# after a complete run only, an interrupted one keeps everything
+		for table, reached in ((self.results, self.reached), (self.files, self.reached_files)):
+			for key in [key for key in table if key not in reached]:
+				del table[key]
+				self.dirty = True
+
+	def file_hash(self, path):
+		self.reached_files.add(path)
+		stamp = (getsize(path), getmtime(path))
+		if path in self.files and self.files[path][0] == stamp:
+			return self.files[path][1]
+		digest = file_sha1(path)
+		self.files[path] = (stamp, digest)
+		self.dirty = True
+		return digest
+
+	def key(self, log, predictor, model_hash):
+		log_hash = self.file_hash(log.path) if log is not None else None
+		key = (log_hash, type(predictor).__name__, predictor.version, model_hash)
+		self.reached.add(key)
+		return key
+
+	def get(self, key):
+		self.reached.add(key)
+		return self.results.get(key)
+
+	def put(self, key, value):
+		self.reached.add(key)
+		if self.results.get(key) != value:
+			self.results[key] = value
+			self.dirty = True
+
+	def wrap(self, key, predict):
+		# a lazy ensemble voter that only predicts on a miss
+		def run():
+			res = self.get(key)
+			if res is None:
+				res = predict()
+				self.put(key, res)
+			return res
+		return run
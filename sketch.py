@@ -0,0 +1,154 @@
+import hashlib
+import heapq
+import math
+from array import array
+
+# Fixed memory counting for high cardinality values (ip.src, dns.qry.name,
+# ProcessID ...). A Count-Min sketch bounds every estimate by
+#   true <= estimate <= true + epsilon * total   with probability 1 - delta
+# and a Space-Saving summary keeps the k most frequent keys to report.
+
+def key_hash(key):
+	digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+	return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+class CountMinSketch:
+	def __init__(self, width, depth):
+		self.width = width
+		self.depth = depth
+		self.table = array('Q', bytes(8 * width * depth))
+		self.total = 0
+
+	@classmethod
+	def from_error(cls, epsilon, delta):
+		return cls(int(math.ceil(math.e / epsilon)), int(math.ceil(math.log(1 / delta))))
+
+	def cells(self, key):
+		# double hashing, one column per row
+		h1, h2 = key_hash(key)
+		for row in range(self.depth):
+			yield row * self.width + (h1 + row * h2) % self.width
+
+	def add(self, key, count=1):
+		self.total += count
+		for cell in self.cells(key):
+			self.table[cell] += count
+
+	def estimate(self, key):
+		return min(self.table[cell] for cell in self.cells(key))
+
+	def merge(self, other):
+		if (self.width, self.depth) != (other.width, other.depth):
+			raise ValueError("sketches of different size cannot be merged")
+		for i, count in enumerate(other.table):
+			self.table[i] += count
+		self.total += other.total
+
+class SpaceSaving:
+	def __init__(self, k):
+		self.k = k
+		self.counts = {}
+		self.heap = []
+
+	def add(self, key, count=1):
+		if key in self.counts:
+			self.counts[key] += count
+		elif len(self.counts) < self.k:
+			self.counts[key] = count
+		else:
+			# the new key inherits the smallest count as its possible error
+			smallest = self.pop_min()
+			self.counts[key] = smallest + count
+		heapq.heappush(self.heap, (self.counts[key], key))
+		if len(self.heap) > 4 * self.k:
+			self.heap = [(c, k) for k, c in self.counts.items()]
+			heapq.heapify(self.heap)
+
+	def pop_min(self):
+		while True:
+			count, key = heapq.heappop(self.heap)
+			if self.counts.get(key) == count:
+				del self.counts[key]
+				return count
+
+	def top(self, n=None):
+		ranked = sorted(self.counts.items(), key=lambda v: (-v[1], str(v[0])))
+		return ranked if n is None else ranked[:n]
+
+class ApproxCounter:
+	def __init__(self, k=1000, epsilon=0.001, delta=0.01):
+		self.k = k
+		self.epsilon = epsilon
+		self.delta = delta
+		self.sketch = CountMinSketch.from_error(epsilon, delta)
+		self.top_k = SpaceSaving(k)
+
+	def add(self, key, count=1):
+		self.sketch.add(key, count)
+		self.top_k.add(key, count)
+
+	def merge(self, other):
+		self.sketch.merge(other.sketch)
+		for key, count in other.top_k.counts.items():
+			self.top_k.add(key, count)
+
+	def __getitem__(self, key):
+		# both overestimate, the smaller one is closer
+		estimate = self.sketch.estimate(key)
+		if key in self.top_k.counts:
+			estimate = min(estimate, self.top_k.counts[key])
+		return estimate
+
+	def get(self, key, default=0):
+		estimate = self[key]
+		return estimate if estimate else default
+
+	def __contains__(self, key):
+		return key in self.top_k.counts
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def __len__(self):
+		return len(self.top_k.counts)
+
+	def keys(self):
+		return [key for key, count in self.top_k.top()]
+
+	def items(self):
+		return [(key, self[key]) for key in self.keys()]
+
+	def values(self):
+		return [count for key, count in self.items()]
+
+class ApproxTable:
+	# key -> {person: count} with one ApproxCounter per person
+	def __init__(self, k=1000, epsilon=0.001, delta=0.01):
+		self.k = k
+		self.epsilon = epsilon
+		self.delta = delta
+		self.persons = {}
+
+	def add(self, key, person, count=1):
+		if person not in self.persons:
+			self.persons[person] = ApproxCounter(self.k, self.epsilon, self.delta)
+		self.persons[person].add(key, count)
+
+	def items(self):
+		keys = set()
+		for counter in self.persons.values():
+			keys.update(counter.keys())
+		for key in sorted(keys, key=str):
+			counts = {}
+			for person, counter in self.persons.items():
+				estimate = counter.sketch.estimate(key)
+				if estimate:
+					counts[person] = counter[key]
+			yield key, counts
+
+def count(table, key, n=1):
+	# the one increment exact dicts and approximate counters share
+	if isinstance(table, dict):
+		table[key] = table.get(key, 0) + n
+	else:
+		table.add(key, n)
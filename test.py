@@ -6,6 +6,14 @@ import json
 import gc
 import pprint
 import multiprocessing as mp
+import pcap
+import evtx
+from chunked_json import map_chunks
+from window import windows, packet_time
+from features import PROTOCOLS, packet_fields
+from sketch import ApproxCounter, count
+from frequency_index import FrequencyIndex
+from functools import partial
 
 try:
     import xml.etree.cElementTree as ET
@@ -68,6 +76,18 @@ class LogXml(Log):
         dfs(first_event, 1)
         print(elem_str(first_event, 0)[1])
 
+class LogEvtx(LogXml):
+    def __init__(self, name, path):
+        super().__init__(name, path)
+        self.type = "evtx"
+
+    def load(self):
+        # same compact tree as the xml export, read from the binary log
+        self.root = evtx.build_tree(self.records())
+
+    def records(self):
+        return evtx.iter_records(self.path)
+
 class LogJson(Log):
     def __init__(self, name, path):
         super().__init__()
@@ -101,6 +121,25 @@ class LogJson(Log):
             end_idx = min(end_idx + val_size, upbound)
             yield (train_set, validation_set)
 
+class LogPcap(Log):
+    def __init__(self, name, path):
+        super().__init__()
+        self.type = "pcap"
+        self.name = name
+        self.path = path
+
+    def load(self):
+        self.data = list(self.packets())
+
+    def packets(self):
+        # streamed straight from the capture, no tshark json round trip
+        return pcap.iter_packets(self.path)
+
+    def show(self, tag):
+        for elem in self.packets():
+            frame = elem["_source"]["layers"]["frame"]
+            print("Wireshark frame.time: "+frame["frame.time"])
+
 class TestCase:
     def __init__(self, name, path):
         self.path = path
@@ -120,6 +159,17 @@ class TestCase:
         else:
             print("Unknown xml file name...")
 
+    def load_evtx(self, file_name):
+        if file_name == "Security.evtx":
+            log = LogEvtx("Security", join(self.path, file_name))
+            self.security_log = log
+
+        elif file_name == "Sysmon.evtx":
+            log = LogEvtx("Sysmon", join(self.path, file_name))
+            self.sysmon_log = log
+        else:
+            print("Unknown evtx file name...")
+
     def load_json(self, file_name):
         if file_name == "Wireshark.json":
             log = LogJson("Wireshark", join(self.path, file_name))
@@ -127,6 +177,13 @@ class TestCase:
         else:
             print("Unknown json file name...")
 
+    def load_pcap(self, file_name):
+        if file_name in ("Wireshark.pcap", "Wireshark.pcapng"):
+            log = LogPcap("Wireshark", join(self.path, file_name))
+            self.wireshark_log = log
+        else:
+            print("Unknown pcap file name...")
+
 
 class DataLoader:
 
@@ -136,10 +193,16 @@ class DataLoader:
     def check_ext(self, file_name, testcase):
         if file_name.endswith("xml"):
             testcase.load_xml(file_name)
+        elif file_name.endswith("evtx"):
+            testcase.load_evtx(file_name)
         elif file_name.endswith("json"):
             testcase.load_json(file_name)
+        elif file_name.endswith("pcap") or file_name.endswith("pcapng"):
+            testcase.load_pcap(file_name)
+        elif file_name.endswith(".features"):
+            pass
         else:
-            print("Only for xml or json...")
+            print("Only for xml, evtx, json or pcap...")
 
     def load_testcase_directory(self):
         print("deprecated")
@@ -170,71 +233,72 @@ class DataLoader:
         return testcase
 
     def __iter__(self):
-        for testcase in listdir(self.path):
-            yield self.load_testcase(testcase)
+        for testcase in sorted(listdir(self.path)):
+            if isdir(join(self.path, testcase)):
+                yield self.load_testcase(testcase)
 
 class Statistics:
     def __init__(self): None
 
 class WiresharkStatistics(Statistics):
-    def __init__(self, data):
+    def __init__(self, data, approx=None):
+        # approx: an empty ApproxCounter, field counts then use fixed memory
         self.data = data
         self.instance_count = len(data)
-        self.field_count = {}
+        self.approx = approx
+        self.field_index = FrequencyIndex()
+        self.field_count = approx if approx is not None else self.field_index.counts
         self.layer_count = {}
 
-        self.protocols = [
-                "ntp",
-                "dhcp",
-                "dhcpv6",
-                "ipv6",
-                "http",
-                "arp",
-                "nbns",
-                "dns",
-                "data",
-                "udp",
-                "tcp.segments",
-                "tls",
-                "tcp",
-                "ip",
-                "frame",
-                "eth"]
+        self.protocols = list(PROTOCOLS)
 
-    def show_range(self, up_bound, low_bound):
+    def index(self):
+        # exact counts keep their index up to date, a sketch only has its top k
+        if self.approx is None:
+            return self.field_index
+        return FrequencyIndex(self.field_count.items())
+
+    @property
+    def sorted_field(self):
+        return list(self.index())
+
+    def fields_in_range(self, up_bound, low_bound):
+        # (field, count) with support in [low_bound, up_bound), ascending
         over_k = int(low_bound * self.instance_count)
         under_k = int(up_bound * self.instance_count)
-        for field in self.sorted_field:
-            if self.field_count[field] >= over_k and self.field_count[field] < under_k:
-                print("{}: {:.2%}".format(field, self.field_count[field]/self.instance_count))
+        return list(self.index().range(over_k, under_k))
+
+    def top(self, k):
+        return self.index().top(k)
+
+    def show_range(self, up_bound, low_bound):
+        for field, n in self.fields_in_range(up_bound, low_bound):
+            print("{}: {:.2%}".format(field, n/self.instance_count))
 
     def calculate(self):
         for d in self.data:
             self.add_instance(d)
 
-    def add_instance(self, new_data):
-
-        field_in_packet = []
+    def packet_fields(self, new_data):
+        return packet_fields(new_data, self.protocols)
 
-        def dfs(parent, node):
-
-            if type(node) is not dict:
-                field = node + "@" + parent
-                if field not in field_in_packet:
-                    if field not in self.field_count:
-                        self.field_count[field] = 1
-                    else:
-                        self.field_count[field] += 1
-                    field_in_packet.append(field)
-                return None
+    def add_instance(self, new_data):
+        for field in self.packet_fields(new_data):
+            self.count_field(field)
 
-            for n in node:
-                if node[n] is not None:
-                    dfs(n, node[n])
+    def count_field(self, field, n=1):
+        if self.approx is None:
+            self.field_index.add(field, n)
+        else:
+            count(self.field_count, field, n)
 
-        for layer in new_data['_source']['layers']:
-            if layer in self.protocols:
-                dfs("layers", new_data['_source']['layers'][layer])
+    def calculate_windows(self, size, step=None):
+        # (start, end, field_count) per window with running add/evict counts,
+        # field_count is only valid until the next window is produced
+        events = ((packet_time(d), self.packet_fields(d)) for d in self.data
+                if packet_time(d) is not None)
+        for start, end, field_count in windows(events, size, step):
+            yield start, end, field_count
 
     def countLayers(self):
         for d in self.data:
@@ -247,6 +311,47 @@ class WiresharkStatistics(Statistics):
             else:
                 self.layer_count[layer] = 1
 
+    def merge(self, field_count, layer_count, instance_count):
+        if isinstance(field_count, ApproxCounter) and isinstance(self.field_count, ApproxCounter):
+            self.field_count.merge(field_count)
+        else:
+            for field, n in field_count.items():
+                self.count_field(field, n)
+        for layer in layer_count:
+            self.layer_count[layer] = self.layer_count.get(layer, 0) + layer_count[layer]
+        self.instance_count += instance_count
+
+    @classmethod
+    def from_features(cls, features):
+        # exact counts of the shared, cached capture features, no packet walk;
+        # sketch counts stream the packets with from_file instead
+        ws = cls([])
+        ws.merge(features.field_counts(), features.layer_counts(), len(features))
+        return ws
+
+    @classmethod
+    def from_file(cls, path, workers=None, approx=None):
+        # chunks of one Wireshark.json are counted in parallel and merged here
+        ws = cls([], approx)
+        # every chunk builds its own counter, a shared one would be merged once per chunk
+        params = None if approx is None else (approx.k, approx.epsilon, approx.delta)
+        if path.endswith("json"):
+            parts = map_chunks(path, partial(statistics_partial, approx=params), workers)
+        else:
+            parts = [statistics_partial(pcap.iter_packets(path), params)]
+        for part in parts:
+            ws.merge(*part)
+        return ws
+
+def statistics_partial(packets, approx=None):
+    # approx: None or the (k, epsilon, delta) of a fresh ApproxCounter
+    ws = WiresharkStatistics([], None if approx is None else ApproxCounter(*approx))
+    for d in packets:
+        ws.add_instance(d)
+        ws.addLayer(d)
+        ws.instance_count += 1
+    return ws.field_count, ws.layer_count, ws.instance_count
+
 class SecurityStatistics(Statistics):
     def __init__(self):
         print("Not Yet")
@@ -0,0 +1,5 @@
+import sys
+from os.path import abspath, dirname
+
+# the modules live flat in the repository root
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
@@ -0,0 +1,66 @@
+from argparse import Namespace
+from os.path import join
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import benchmark as bench
+from features import capture_features
+from gen_dataset import generate
+from predict import DataLoader
+from train import train
+
+# the benchmark.py stages as pytest-benchmark tests over a small generated
+# dataset: pytest --benchmark-only --benchmark-autosave, then
+# pytest-benchmark compare to see the change between commits
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+	root = tmp_path_factory.mktemp("bench")
+	data_root = str(root / "data")
+	generate(Namespace(output=data_root, persons=2, cases=1, size="64KB", seed=0))
+	tables = str(root / "trained")
+	train(Namespace(file_path=data_root, output=tables, labels=join(data_root, "labels.csv"), workers=1,
+			min_support=1, determinism=0.0, deterministic=False, approx_k=None, epsilon=0.001, delta=0.01))
+	return next(iter(DataLoader(data_root))), bench.load_predictors(tables)
+
+def test_log_xml_load(benchmark, dataset):
+	testcase, predictors = dataset
+	log = testcase.security_log
+	benchmark(log.load)
+	assert log.root is not None
+
+def test_log_json_load(benchmark, dataset):
+	testcase, predictors = dataset
+	log = testcase.wireshark_log
+	benchmark(log.load)
+	assert log.data
+
+def test_capture_features(benchmark, dataset):
+	testcase, predictors = dataset
+	features = benchmark(capture_features, testcase.wireshark_log.path, 1, False)
+	assert len(features)
+
+def test_extract_features(benchmark, dataset):
+	testcase, (wireshark_predictor, security_predictor, sysmon_predictor) = dataset
+	features = capture_features(testcase.wireshark_log.path, cache=False)
+	assert benchmark(wireshark_predictor.extract_features, features)
+
+def test_predict_wireshark(benchmark, dataset):
+	testcase, (wireshark_predictor, security_predictor, sysmon_predictor) = dataset
+	fields = wireshark_predictor.extract_features(capture_features(testcase.wireshark_log.path, cache=False))
+	assert benchmark(wireshark_predictor.predict_fields, fields)[0] == 1
+
+@pytest.mark.parametrize("name", ["Security", "Sysmon"])
+def test_predict_xml(benchmark, dataset, name):
+	testcase, (wireshark_predictor, security_predictor, sysmon_predictor) = dataset
+	log, predictor = {"Security": (testcase.security_log, security_predictor),
+			"Sysmon": (testcase.sysmon_log, sysmon_predictor)}[name]
+	log.load()
+	assert benchmark(predictor.predict_conf, log.root)[0] == 1
+
+def test_pipeline(benchmark, dataset):
+	testcase, predictors = dataset
+	# the feature cache is written by the first round, later rounds reuse it
+	assert benchmark(bench.pipeline, testcase, predictors, 1) == 1
@@ -0,0 +1,32 @@
+import json
+from argparse import Namespace
+
+import benchmark
+import features
+from gen_dataset import generate
+
+def test_benchmark_smoke(tmp_path, monkeypatch):
+	# the Wireshark stages time the uncached feature path the pipeline uses
+	uncached = []
+	def capture_features(path, workers=1, cache=True):
+		if not cache:
+			uncached.append(path)
+		return features.capture_features(path, workers, cache)
+	monkeypatch.setattr(benchmark, "capture_features", capture_features)
+
+	data_root = str(tmp_path / "bench_data")
+	generate(Namespace(output=data_root, persons=2, cases=1, size="16KB", seed=0))
+	output = str(tmp_path / "benchmark.jsonl")
+	args = Namespace(data_root=data_root, tables=str(tmp_path / "trained"), repeat=1, workers=1, output=output)
+	benchmark.benchmark(args)
+	benchmark.benchmark(args)
+
+	with open(output) as f:
+		runs = [json.loads(l) for l in f]
+	assert len(runs) == 2
+	for run in runs:
+		assert run["testcases"] == 2
+		assert set(run["seconds"]) == set(benchmark.STAGES)
+	# the deterministic tie break gives the same answers every run
+	assert runs[0]["answers"] == runs[1]["answers"]
+	assert len(uncached) == 4
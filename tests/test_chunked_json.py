@@ -0,0 +1,83 @@
+import json
+import mmap
+
+import chunked_json
+
+def packet(i, uri):
+	return {"_index": "p", "_type": "doc", "_score": None, "_source": {"layers": {
+			"frame": {"frame.number": str(i)}, "http": {"http.request.uri": uri}}}}
+
+def write_capture(path, packets):
+	with open(path, 'w') as f:
+		json.dump(packets, f, indent=2)
+
+def open_map(path):
+	with open(path, 'rb') as f:
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def test_false_candidate_is_rejected_without_growing(tmp_path):
+	packets = [packet(i, "/q?a=1}, {b=2" if i == 10 else "/" + "x" * 200) for i in range(2000)]
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, packets)
+
+	mm = open_map(path)
+	reader = chunked_json.PacketReader(mm, 4096)
+	start = mm.find(b"}, {b=2")
+	pos, (obj, end) = reader.first_start(start)
+	assert obj == packets[11]
+	assert len(reader.buf) <= 4096
+	assert list(reader.packets(start, len(mm))) == packets[11:]
+	assert len(reader.buf) <= 4096
+	mm.close()
+
+def test_chunks_split_on_false_candidates(tmp_path):
+	packets = [packet(i, "/q?a=1}, {b=2" if i % 7 == 0 else "/p") for i in range(500)]
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, packets)
+	parts = chunked_json.map_chunks(path, list, workers=1, min_chunk=1)
+	assert len(parts) == 4
+	assert [p for part in parts for p in part] == packets
+
+def test_packet_larger_than_window(tmp_path):
+	packets = [packet(i, "/" + "y" * (20000 if i == 3 else 10)) for i in range(50)]
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, packets)
+
+	mm = open_map(path)
+	reader = chunked_json.PacketReader(mm, 1024)
+	assert list(reader.packets(0, len(mm))) == packets
+	mm.close()
+
+def literal_packet(i):
+	return {"_index": "p", "_type": "doc", "_score": None, "_source": {"layers": {
+			"frame": {"frame.number": str(i)}, "flags": [True, False, -12.5e3, 7], "host": "caf\u00e9"}}}
+
+def test_window_boundary_inside_literals(tmp_path):
+	packets = [literal_packet(i) for i in range(4)]
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, packets)
+
+	mm = open_map(path)
+	first = mm.find(b"{")
+	second = mm.find(b"}, {") + 3
+	for literal in (b"null", b"true", b"false", b"-12500.0", b"7", b"\\u00e9"):
+		for packet_start, start in ((first, 0), (second, second)):
+			at = mm.find(literal, packet_start)
+			for cut in range(1, len(literal)):
+				# the first window of the packet ends inside the literal
+				reader = chunked_json.PacketReader(mm, at + cut - packet_start)
+				expected = packets if start == 0 else packets[1:]
+				assert list(reader.packets(start, len(mm))) == expected, (literal, cut)
+	mm.close()
+
+def test_every_window_size(tmp_path):
+	packets = [literal_packet(i) for i in range(6)]
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, packets)
+
+	mm = open_map(path)
+	second = mm.find(b"}, {") + 3
+	for window in range(1, 400):
+		assert list(chunked_json.PacketReader(mm, window).packets(0, len(mm))) == packets, window
+		assert list(chunked_json.PacketReader(mm, window).packets(second, len(mm))) == packets[1:], window
+	mm.close()
@@ -0,0 +1,43 @@
+from os.path import dirname, join
+
+import pytest
+
+import evtx
+from predict import LogEvtx
+
+DATA = join(dirname(__file__), "data")
+
+# EventID, Task, ProcessID, TimeCreated, EventRecordID as the XML export shows them
+SECURITY = [
+		("5152", "12809", "4", "2016-06-29T15:24:34.346000000Z", "319457771"),
+		("4611", "12289", "768", "2016-06-29T15:24:36.686000000Z", "319457830"),
+		("4776", "14336", "768", "2016-06-29T15:24:36.686000000Z", "319457831"),
+		("4625", "12544", "768", "2016-06-29T15:24:36.686000000Z", "319457832"),
+		("5152", "12809", "4", "2016-06-29T15:24:57.090800000Z", "319457855"),
+		("5157", "12810", "4", "2016-06-29T15:24:57.090800000Z", "319457856"),
+		("4673", "13056", "768", "2016-06-29T15:25:08.822000000Z", "319457858")]
+
+def test_security_records():
+	records = list(evtx.iter_records(join(DATA, "Security.evtx")))
+	assert [(r["EventID"], r["Task"], r["ProcessID"], r["TimeCreated"], r["RecordID"])
+			for r in records] == SECURITY
+
+def test_security_tree_matches_xml_layout():
+	log = LogEvtx("Security", join(DATA, "Security.evtx"))
+	log.load()
+	ns = "{" + evtx.EVENT_NS + "}"
+	events = log.root.findall(ns + "Event")
+	assert len(events) == len(SECURITY)
+	for event, (event_id, task, pid, created, record) in zip(events, SECURITY):
+		system = event.find(ns + "System")
+		assert system.find(ns + "EventID").text == event_id
+		assert system.find(ns + "Task").text == task
+		assert system.find(ns + "Execution").attrib["ProcessID"] == pid
+		assert system.find(ns + "TimeCreated").attrib["SystemTime"] == created
+		assert system.find(ns + "EventRecordID").text == record
+
+def test_not_an_evtx(tmp_path):
+	path = tmp_path / "Security.evtx"
+	path.write_bytes(b"\0" * 4096)
+	with pytest.raises(ValueError):
+		list(evtx.iter_records(str(path)))
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import test as statistics
+from frequency_index import FrequencyIndex
+from sketch import ApproxCounter
+
+def random_counts(rng, add, n, keys):
+	counts = {}
+	for i in range(n):
+		# a few heavy keys and a long tail
+		key = "key{}".format(int(rng.paretovariate(1.2)) if rng.random() < 0.5 else rng.randrange(keys))
+		count = rng.choice([1, 1, 1, 2, 5])
+		add(key, count)
+		counts[key] = counts.get(key, 0) + count
+	return counts
+
+def ascending(pairs):
+	return sorted(pairs, key=lambda pair: (pair[1], pair[0]))
+
+def check_range(got, counts, low, high):
+	got = list(got)
+	assert [count for key, count in got] == sorted(count for key, count in got)
+	assert ascending(got) == ascending((key, count) for key, count in counts.items()
+			if low <= count and (high is None or count < high))
+
+def check_top(got, counts, k):
+	# equal counts may come in any order, the counts and every key above the
+	# last count are fixed
+	ranked = sorted(counts.values(), reverse=True)[:k]
+	assert [count for key, count in got] == ranked
+	assert all(counts[key] == count for key, count in got)
+	if ranked:
+		assert {key for key, count in got if count > ranked[-1]} == {key for key, count in counts.items() if count > ranked[-1]}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_index_matches_sorted_dict(seed):
+	rng = random.Random(seed)
+	index = FrequencyIndex()
+	counts = {}
+	for step in range(4):
+		for key, count in random_counts(rng, index.add, 500, 300).items():
+			counts[key] = counts.get(key, 0) + count
+		assert index.counts == counts and len(index) == len(counts)
+		assert index.distinct == sorted(set(counts.values()))
+		assert all(index.buckets[count] for count in index.distinct)
+		assert [counts[key] for key in index] == sorted(counts.values())
+		for i in range(20):
+			low = rng.randrange(0, 60)
+			high = rng.choice([None, low, low + 1, low + rng.randrange(1, 100)])
+			check_range(index.range(low, high), counts, low, high)
+		for k in (0, 1, 5, 50, 1000):
+			check_top(index.top(k), counts, k)
+
+def test_empty_index():
+	index = FrequencyIndex()
+	assert list(index) == [] and index.top(3) == [] and list(index.range(0)) == []
+	assert list(FrequencyIndex([("a", 2), ("b", 1), ("a", 1)]).range(0)) == [("b", 1), ("a", 3)]
+
+def check_statistics(ws, counts, rng):
+	assert sorted(counts[key] for key in counts) == [counts[key] for key in ws.sorted_field]
+	assert set(ws.sorted_field) == set(counts)
+	for i in range(20):
+		low, up = sorted(rng.random() * 0.2 for i in range(2))
+		check_range(ws.fields_in_range(up, low), counts,
+				int(low * ws.instance_count), int(up * ws.instance_count))
+	for k in (1, 10, 100):
+		check_top(ws.top(k), counts, k)
+
+@pytest.mark.parametrize("approx", [None, 50])
+def test_statistics_ranges(approx):
+	rng = random.Random(3)
+	ws = statistics.WiresharkStatistics([], None if approx is None else ApproxCounter(approx))
+	for step in range(3):
+		ws.instance_count += 1000
+		random_counts(rng, ws.count_field, 1000, 400)
+		# the sketch index is rebuilt from the counter's top k on every query
+		counts = dict(ws.field_count.items())
+		if approx is None:
+			assert ws.index() is ws.field_index
+		else:
+			assert len(counts) == approx
+		check_statistics(ws, counts, rng)
+
+def test_sketch_index_is_exact_below_k():
+	ws = statistics.WiresharkStatistics([], ApproxCounter(100))
+	exact = statistics.WiresharkStatistics([])
+	for i in range(2000):
+		key = "field{}@ip.src".format(i % 37 * i % 80)
+		ws.count_field(key)
+		exact.count_field(key)
+	assert ws.index().counts == exact.index().counts
+	check_top(ws.top(10), exact.field_count, 10)
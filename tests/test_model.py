@@ -0,0 +1,86 @@
+import os
+import shutil
+from os.path import dirname, join
+
+import pytest
+
+import model
+from field_index import build_index, lookup
+from model import Model, open_model, read_csv_dir
+
+TABLES = join(dirname(dirname(__file__)), "field_value_dict")
+
+def test_index_is_compiled_into_the_model(tmp_path):
+	rows = read_csv_dir(TABLES)[0]
+	index = build_index(rows)
+	path = str(tmp_path / "field_value_dict.bin")
+	compiled = open_model(TABLES, path)
+	assert compiled.index.key_count == len(index)
+	for key, (counts, total) in index.items():
+		assert compiled.index_entry(key) == (counts, total)
+
+	for key in rows:
+		query = "unseen." + key
+		assert lookup(compiled.index_entry, query) == lookup(index.get, query)
+
+def test_open_model_checks_staleness_by_mtime(tmp_path, monkeypatch):
+	tables = str(tmp_path / "field_value_dict")
+	shutil.copytree(TABLES, tables)
+	path = str(tmp_path / "field_value_dict.bin")
+	open_model(tables, path).close()
+
+	def no_hash(directory):
+		raise AssertionError("tables hashed although unchanged")
+	monkeypatch.setattr(model, "source_checksum", no_hash)
+	open_model(tables, path).close()
+	monkeypatch.undo()
+
+	# touched but equal content only refreshes the stamp
+	csv = join(tables, sorted(os.listdir(tables))[0])
+	stamp = model.source_stamp(tables) + 10**9
+	os.utime(csv, ns=(stamp, stamp))
+	old = Model(path)
+	before = os.stat(path).st_size, old.checksum
+	old.close()
+	refreshed = open_model(tables, path)
+	assert (os.stat(path).st_size, refreshed.checksum) == before
+	assert refreshed.stamp == stamp
+	refreshed.close()
+
+	with open(csv, 'a') as f:
+		f.write("unseen.example@http.host,7:3\n")
+	assert open_model(tables, path).get("unseen.example@http.host") == {7: 3}
+
+@pytest.mark.parametrize("keep", [0, 10, 40, 200, 0.5])
+def test_truncated_model_is_compiled_again(tmp_path, keep):
+	path = str(tmp_path / "field_value_dict.bin")
+	open_model(TABLES, path).close()
+	with open(path, 'rb') as f:
+		data = f.read()
+	with open(path, 'wb') as f:
+		f.write(data[:int(len(data) * keep) if keep < 1 else keep])
+	with pytest.raises(ValueError):
+		Model(path)
+
+	compiled = open_model(TABLES, path)
+	assert len(compiled) == len(read_csv_dir(TABLES)[0])
+	compiled.close()
+	with open(path, 'rb') as f:
+		assert f.read() == data
+
+def test_recompile_leaves_mapped_model_intact(tmp_path):
+	tables = str(tmp_path / "field_value_dict")
+	shutil.copytree(TABLES, tables)
+	path = str(tmp_path / "field_value_dict.bin")
+	mapped = open_model(tables, path)
+	before = dict(mapped.items())
+
+	csv = join(tables, sorted(os.listdir(tables))[0])
+	with open(csv, 'a') as f:
+		f.write("unseen.example@http.host,7:3\n")
+	recompiled = open_model(tables, path)
+	assert recompiled.get("unseen.example@http.host") == {7: 3}
+	assert dict(mapped.items()) == before
+	assert not os.path.exists(path + ".tmp")
+	mapped.close()
+	recompiled.close()
@@ -0,0 +1,157 @@
+import struct
+
+import pytest
+
+import pcap
+from features import packet_fields
+
+# captures are built byte by byte here, so every layout the reader accepts is
+# covered without checking in binary files
+
+START = 1591000000
+
+def dns_name(name):
+	return b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\0"
+
+def dns(ident, query, answer=None):
+	# the answer name points into the query: "mail" + pointer to "example.com"
+	flags = 0x8180 if answer else 0x0100
+	data = struct.pack("!HHHHHH", ident, flags, 1, 1 if answer else 0, 0, 0)
+	data += dns_name(query) + struct.pack("!HH", 1, 1)
+	if answer:
+		suffix = 12 + 1 + len(query.split(".")[0])
+		data += b"\x04mail" + struct.pack("!H", 0xc000 | suffix)
+		data += struct.pack("!HHIH", 1, 1, 60, 4) + bytes(answer)
+	return data
+
+def cname_chain():
+	# www.example.com -> www.example.com.edgekey.net -> e1.a.akamaiedge.net -> A,
+	# an NS authority record and the address of that nameserver
+	data = struct.pack("!HHHHHH", 2, 0x8180, 1, 3, 1, 1) + dns_name("www.example.com") + struct.pack("!HH", 1, 1)
+	edgekey = dns_name("www.example.com.edgekey.net")
+	akamai = b"\x02e1\x01a" + dns_name("akamaiedge.net")
+	data += b"\xc0\x0c" + struct.pack("!HHIH", 5, 1, 60, len(edgekey)) + edgekey
+	# the next owner name points at the CNAME data written just before
+	edgekey_at = len(data) - len(edgekey)
+	data += struct.pack("!H", 0xc000 | edgekey_at) + struct.pack("!HHIH", 5, 1, 60, len(akamai)) + akamai
+	akamai_at = len(data) - len(akamai)
+	data += struct.pack("!H", 0xc000 | akamai_at) + struct.pack("!HHIH", 1, 1, 20, 4) + bytes([23, 1, 2, 3])
+	ns = b"\x04n0ns" + struct.pack("!H", 0xc000 | akamai_at + 5)
+	data += struct.pack("!H", 0xc000 | akamai_at + 5) + struct.pack("!HHIH", 2, 1, 3600, len(ns)) + ns
+	data += dns_name("n0ns.akamaiedge.net") + struct.pack("!HHIH", 1, 1, 3600, 4) + bytes([88, 221, 81, 192])
+	return data
+
+def udp(sport, dport, payload):
+	return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+def tcp(sport, dport, payload):
+	return struct.pack("!HHIIHHHH", sport, dport, 1, 0, (5 << 12) | 0x18, 1024, 0, 0) + payload
+
+def ip(proto, src, dst, payload):
+	return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, 0, 64, proto, 0,
+			bytes(src), bytes(dst)) + payload
+
+def eth(ethertype, payload, vlan=None):
+	head = bytes.fromhex("001122334455") + bytes.fromhex("66778899aabb")
+	if vlan is not None:
+		head += struct.pack("!HH", 0x8100, vlan)
+	return head + struct.pack("!H", ethertype) + payload
+
+def arp(src, dst):
+	return (struct.pack("!HHBBH", 1, 0x0800, 6, 4, 1) + bytes.fromhex("66778899aabb") + bytes(src)
+			+ bytes(6) + bytes(dst))
+
+PACKETS = [
+		eth(0x0800, ip(17, [10, 0, 0, 1], [8, 8, 8, 8], udp(5000, 53, dns(1, "www.example.com")))),
+		eth(0x0800, ip(17, [8, 8, 8, 8], [10, 0, 0, 1],
+			udp(53, 5000, dns(1, "www.example.com", [93, 184, 216, 34])))),
+		eth(0x0800, ip(6, [10, 0, 0, 1], [93, 184, 216, 34],
+			tcp(5001, 80, b"GET / HTTP/1.1\r\nHost: rrr34tw.tk\r\nUser-Agent: x\r\n\r\n"))),
+		eth(0x0806, arp([10, 0, 0, 1], [10, 0, 0, 254])),
+		eth(0x0800, ip(17, [10, 0, 1, 5], [10, 0, 1, 255], udp(6000, 6001, b"hello")), vlan=20),
+		eth(0x0800, ip(17, [8, 8, 8, 8], [10, 0, 0, 1], udp(53, 5001, cname_chain())))]
+
+EXPECTED = [
+		{"www.example.com@dns.qry.name", "10.0.0.1@ip.src", "8.8.8.8@ip.dst", "53@udp.dstport"},
+		{"www.example.com@dns.qry.name", "mail.example.com@dns.resp.name", "8.8.8.8@ip.src"},
+		{"rrr34tw.tk@http.host", "GET@http.request.method", "93.184.216.34@ip.dst", "80@tcp.dstport",
+			"0x00000018@tcp.flags"},
+		{"10.0.0.1@arp.src.proto_ipv4", "10.0.0.254@arp.dst.proto_ipv4", "0x00000806@eth.type"},
+		{"10.0.1.5@ip.src", "0x00008100@eth.type", "0x00000800@vlan.etype", "5@data.len"},
+		{"www.example.com@dns.qry.name", "www.example.com@dns.resp.name",
+			"www.example.com.edgekey.net@dns.cname", "www.example.com.edgekey.net@dns.resp.name",
+			"e1.a.akamaiedge.net@dns.cname", "e1.a.akamaiedge.net@dns.resp.name", "23.1.2.3@dns.a",
+			"akamaiedge.net@dns.resp.name", "n0ns.akamaiedge.net@dns.ns",
+			"n0ns.akamaiedge.net@dns.resp.name", "88.221.81.192@dns.a", "0x00008180@dns.flags"}]
+
+def write_pcap(path, endian, nanoseconds):
+	magic = 0xa1b23c4d if nanoseconds else 0xa1b2c3d4
+	with open(path, "wb") as f:
+		f.write(struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, pcap.LINKTYPE_ETHERNET))
+		for i, packet in enumerate(PACKETS):
+			frac = 123456789 if nanoseconds else 123456
+			f.write(struct.pack(endian + "IIII", START + i, frac, len(packet), len(packet)) + packet)
+
+def block(endian, block_type, body):
+	body += bytes(-len(body) % 4)
+	return struct.pack(endian + "II", block_type, 12 + len(body)) + body + struct.pack(endian + "I", 12 + len(body))
+
+def write_pcapng(path, endian, simple):
+	with open(path, "wb") as f:
+		f.write(block(endian, 0x0a0d0d0a, struct.pack(endian + "IHHq", 0x1a2b3c4d, 1, 0, -1)))
+		# if_tsresol 9: timestamps count nanoseconds
+		options = struct.pack(endian + "HHB3x", 9, 1, 9) + struct.pack(endian + "HH", 0, 0)
+		f.write(block(endian, 1, struct.pack(endian + "HHI", pcap.LINKTYPE_ETHERNET, 0, 65535) + options))
+		for i, packet in enumerate(PACKETS):
+			if simple:
+				f.write(block(endian, 3, struct.pack(endian + "I", len(packet)) + packet))
+			else:
+				ts = (START + i) * 10**9 + 123456789
+				f.write(block(endian, 6, struct.pack(endian + "IIIII", 0, ts >> 32, ts & 0xffffffff,
+						len(packet), len(packet)) + packet))
+
+def check(path, times):
+	packets = list(pcap.iter_packets(path))
+	assert len(packets) == len(PACKETS)
+	for packet, expected, time in zip(packets, EXPECTED, times):
+		layers = packet["_source"]["layers"]
+		assert expected <= set(packet_fields(packet, list(layers)))
+		assert float(layers["frame"]["frame.time_epoch"]) == pytest.approx(time, abs=1e-6)
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+@pytest.mark.parametrize("nanoseconds", [False, True])
+def test_pcap(tmp_path, endian, nanoseconds):
+	path = str(tmp_path / "capture.pcap")
+	write_pcap(path, endian, nanoseconds)
+	frac = 0.123456789 if nanoseconds else 0.123456
+	check(path, [START + i + frac for i in range(len(PACKETS))])
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_pcapng_enhanced_packets(tmp_path, endian):
+	path = str(tmp_path / "capture.pcapng")
+	write_pcapng(path, endian, False)
+	check(path, [START + i + 0.123456789 for i in range(len(PACKETS))])
+
+def test_pcapng_simple_packets(tmp_path):
+	# simple packet blocks carry no timestamp
+	path = str(tmp_path / "capture.pcapng")
+	write_pcapng(path, "<", True)
+	check(path, [0.0] * len(PACKETS))
+
+def test_not_a_capture(tmp_path):
+	path = tmp_path / "capture.pcap"
+	path.write_bytes(b"not a capture at all")
+	with pytest.raises(ValueError):
+		list(pcap.iter_packets(str(path)))
+
+def test_dns_records_nest_like_tshark(tmp_path):
+	path = str(tmp_path / "capture.pcap")
+	write_pcap(path, "<", False)
+	dns = list(pcap.iter_packets(path))[-1]["_source"]["layers"]["dns"]
+	assert list(dns["Queries"]) == ["www.example.com: type A, class IN"]
+	assert list(dns["Answers"]) == [
+			"www.example.com: type CNAME, class IN, cname www.example.com.edgekey.net",
+			"www.example.com.edgekey.net: type CNAME, class IN, cname e1.a.akamaiedge.net",
+			"e1.a.akamaiedge.net: type A, class IN, addr 23.1.2.3"]
+	assert list(dns["Authoritative nameservers"]) == ["akamaiedge.net: type NS, class IN, ns n0ns.akamaiedge.net"]
+	assert list(dns["Additional records"]) == ["n0ns.akamaiedge.net: type A, class IN, addr 88.221.81.192"]
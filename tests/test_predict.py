@@ -0,0 +1,186 @@
+import json
+import random
+from os.path import dirname, join
+
+import pytest
+
+from features import capture_features, packet_fields
+from field_index import build_index, lookup
+from model import open_model, read_csv_dir
+from predict import Ensemble, WiresharkPredictor
+
+TABLES = join(dirname(dirname(__file__)), "field_value_dict")
+
+@pytest.fixture(scope="module")
+def rows():
+	return read_csv_dir(TABLES)[0]
+
+def predictors(tmp_path, suffix_match):
+	from_csv = WiresharkPredictor(suffix_match)
+	from_csv.load(TABLES)
+	from_model = WiresharkPredictor(suffix_match)
+	from_model.load_model(open_model(TABLES, str(tmp_path / "field_value_dict.bin")))
+	return from_csv, from_model
+
+@pytest.mark.parametrize("suffix_match", [True, False])
+def test_exact_rows_score_on_both_paths(tmp_path, rows, suffix_match):
+	from_csv, from_model = predictors(tmp_path, suffix_match)
+	for key in rows:
+		if '@' not in key or not rows[key]:
+			continue
+		expected = from_model.predict_fields({key: 1})
+		assert expected[0] != 0
+		assert from_csv.predict_fields({key: 1}) == expected
+
+def test_exact_match_drops_only_the_fallback(tmp_path, rows):
+	host = next(key for key in rows if key.endswith("@http.host") and key.count('.') >= 2)
+	unseen = "unseen-host." + host
+	for predictor in predictors(tmp_path, False):
+		assert predictor.predict_fields({unseen: 1}) == [0, 0]
+	for predictor in predictors(tmp_path, True):
+		assert predictor.predict_fields({unseen: 1})[0] != 0
+
+def test_collapsed_rule_keeps_sums():
+	rows = {"a.example.com@http.host": {1: 2}, "b.example.com@http.host": {1: 4},
+			"x.other.com@http.host": {1: 1}, "y.other.com@http.host": {2: 1}}
+	index = build_index(rows)
+	# one rule replaces the subtree, with the real sums and entry count
+	assert index["=http.host@example.com"] == ({1: 6}, 2)
+	assert not any(key.endswith("a.example.com") for key in index)
+	assert lookup(index.get, "c.example.com@http.host") == {1: 3.0}
+	assert lookup(index.get, "z.other.com@http.host") == {1: 0.5, 2: 0.5}
+
+def dns_packet(time, name, address):
+	# tshark nests queries and answers below the dns layer
+	return {"_source": {"layers": {
+			"frame": {"frame.time_epoch": "{:.6f}".format(time)},
+			"ip": {"ip.src": "10.0.0.2", "ip.dst": "10.0.0.1"},
+			"dns": {"dns.id": "0x1234",
+				"Queries": {name + ": type A, class IN": {"dns.qry.name": name, "dns.qry.type": "1"}},
+				"Answers": {name + ": type A, class IN, addr " + address: {
+					"dns.resp.name": name, "dns.a": address}}}}}}
+
+def test_extract_walks_nested_fields(tmp_path):
+	packets = [dns_packet(1590998400.0, "www.example.com", "93.184.216.34"),
+			dns_packet(1590998401.5, "mail.example.org", "93.184.216.35")]
+	predictor = WiresharkPredictor()
+	fields = predictor.extract(packets)
+	assert {"www.example.com@dns.qry.name", "www.example.com@dns.resp.name",
+			"mail.example.org@dns.qry.name", "10.0.0.2@ip.src", "dns", "ip"} <= set(fields)
+	assert "93.184.216.34@dns.a" not in fields
+
+	path = str(tmp_path / "Wireshark.json")
+	with open(path, 'w') as f:
+		json.dump(packets, f)
+	assert fields == predictor.extract_features(capture_features(path, cache=False))
+
+	events = list(predictor.events(packets))
+	assert [time for time, keys in events] == [1590998400.0, 1590998401.5]
+	assert "mail.example.org@dns.resp.name" in events[1][1]
+
+def test_extract_list_values():
+	# repeated fields and layers come as lists in tshark json
+	packet = {"_source": {"layers": {
+			"frame": {"frame.time_epoch": "1590998400.000000"},
+			"ip": {"ip.src": "10.0.0.2", "ip.dst": "10.0.0.1"},
+			"tcp": {"tcp.srcport": "49152"},
+			"http": {"http.host": "www.example.com",
+				"http.request.line": ["Host: www.example.com\r\n", "Accept: */*\r\n"]},
+			"tls": [{"tls.record": [{"tls.record.version": "0x0303"}, {"tls.record.version": "0x0301"}]},
+				{"tls.record": {"tls.record.version": "0x0302"}}]}}}
+	fields = WiresharkPredictor().extract([packet])
+	assert {"10.0.0.2@ip.src", "10.0.0.1@ip.dst", "www.example.com@http.host", "http", "ip"} <= set(fields)
+
+	keys = set(packet_fields(packet))
+	assert {"Accept: */*\r\n@http.request.line", "0x0303@tls.record.version",
+			"0x0301@tls.record.version", "0x0302@tls.record.version"} <= keys
+
+def test_index_drops_only_redundant_sums():
+	# one entry seen by two persons is not collapsed into a rule
+	rows = {"www.a.example.com@http.host": {1: 2, 2: 1}, "x.b.example.com@http.host": {2: 3}}
+	index = build_index(rows)
+	# www.a.example.com and a.example.com hold the same single entry
+	assert index["~http.host@a.example.com"] == ({1: 2, 2: 1}, 1)
+	assert "~http.host@www.a.example.com" not in index
+	assert lookup(index.get, "z.www.a.example.com@http.host") == {1: 2.0, 2: 1.0}
+	assert lookup(index.get, "q.example.com@http.host") == {1: 1.0, 2: 2.0}
+
+def voter(res, calls=None, name=None):
+	def predict():
+		if calls is not None:
+			calls.append(name)
+		return res
+	return predict
+
+def test_heavy_voter_skipped_when_cheap_voters_agree():
+	calls = []
+	ensemble = Ensemble()
+	ensemble.add("Wireshark", voter([2, 0.9], calls, "Wireshark"), cost=10)
+	ensemble.add("Security", voter([1, 0.5], calls, "Security"))
+	ensemble.add("Sysmon", voter([1, 0.5], calls, "Sysmon"))
+	assert ensemble.vote() == 1
+	assert calls == ["Security", "Sysmon"]
+
+	# a split decides only with the heavy voter
+	calls = []
+	ensemble = Ensemble()
+	ensemble.add("Wireshark", voter([2, 0.9], calls, "Wireshark"), cost=10)
+	ensemble.add("Security", voter([1, 0.5], calls, "Security"))
+	ensemble.add("Sysmon", voter([2, 0.5], calls, "Sysmon"))
+	assert ensemble.vote() == 2
+	assert calls == ["Security", "Sysmon", "Wireshark"]
+
+def test_tie_break_order():
+	def vote(results, weights=(1.0, 1.0, 1.0)):
+		ensemble = Ensemble()
+		for name, res, weight in zip(["Wireshark", "Security", "Sysmon"], results, weights):
+			ensemble.add(name, voter(res), weight, 10 if name == "Wireshark" else 1)
+		return ensemble.vote()
+
+	# one vote each, the higher summed confidence wins
+	assert vote([[0, 0], [1, 0.4], [2, 0.6]]) == 2
+	assert vote([[0, 0], [1, 0.6], [2, 0.4]]) == 1
+	# equal confidence, the heaviest voter wins
+	assert vote([[0, 0], [1, 0.5], [2, 0.5]], (1.0, 1.0, 1.0001)) == 2
+	assert vote([[0, 0], [2, 0.5], [1, 0.5]], (1.0, 1.0001, 1.0)) == 2
+	# everything equal, the lowest person
+	assert vote([[0, 0], [2, 0.5], [1, 0.5]]) == 1
+	assert vote([[3, 0.5], [2, 0.5], [1, 0.5]]) == 1
+	assert vote([[0, 0], [0, 0], [0, 0]]) == 0
+
+def test_random_tie_break_is_seeded():
+	def vote(seed):
+		ensemble = Ensemble(tie_break="random", seed=seed)
+		ensemble.add("Wireshark", voter([3, 0.5]), cost=10)
+		ensemble.add("Security", voter([1, 0.5]))
+		ensemble.add("Sysmon", voter([2, 0.5]))
+		return ensemble.vote()
+
+	assert [vote(seed) for seed in range(20)] == [vote(seed) for seed in range(20)]
+	assert set(vote(seed) for seed in range(50)) == {1, 2, 3}
+
+def full_vote(mode, voters):
+	# every voter evaluated, then the same ranking as Ensemble.leader
+	poll, conf_sum, heaviest = {}, {}, {}
+	for name in voters:
+		(person, conf), weight, cost = voters[name]
+		if person == 0:
+			continue
+		value = {"majority": 1.0, "weighted": weight, "confidence": weight * conf}[mode]
+		poll[person] = poll.get(person, 0) + value
+		conf_sum[person] = conf_sum.get(person, 0) + conf
+		heaviest[person] = max(heaviest.get(person, 0), weight)
+	if not poll:
+		return 0
+	return max(poll, key=lambda person: (poll[person], conf_sum[person], heaviest[person], -person))
+
+def test_early_exit_matches_full_evaluation():
+	rng = random.Random(3)
+	for i in range(2000):
+		mode = rng.choice(["majority", "weighted", "confidence"])
+		voters = {name: ([rng.randrange(4), rng.choice([0.25, 0.5, 0.75, 1.0])], rng.choice([0.5, 1.0, 2.0]), cost)
+				for name, cost in (("Wireshark", 10), ("Security", 1), ("Sysmon", 1))}
+		ensemble = Ensemble(mode)
+		for name, (res, weight, cost) in voters.items():
+			ensemble.add(name, voter(res), weight, cost)
+		assert ensemble.vote() == full_vote(mode, voters), voters
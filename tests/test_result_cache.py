@@ -0,0 +1,56 @@
+from result_cache import ResultCache
+
+class Log:
+	def __init__(self, path):
+		self.path = path
+
+class Predictor:
+	version = 1
+
+def run(cache_path, logs, finished=True):
+	# one predict.py run over logs, the results are the log names
+	cache = ResultCache(cache_path)
+	computed = []
+	try:
+		for log in logs:
+			key = cache.key(log, Predictor(), "model")
+			if cache.get(key) is None:
+				computed.append(log.path)
+				cache.put(key, log.path)
+		if finished:
+			cache.prune()
+	finally:
+		cache.save()
+	return computed
+
+def test_unchanged_results_are_reused(tmp_path):
+	logs = []
+	for name in ("a", "b"):
+		path = tmp_path / name
+		path.write_text(name)
+		logs.append(Log(str(path)))
+	cache_path = str(tmp_path / "cache.pkl")
+
+	assert run(cache_path, logs) == [log.path for log in logs]
+	assert run(cache_path, logs) == []
+	(tmp_path / "b").write_text("changed")
+	assert run(cache_path, logs) == [logs[1].path]
+
+def test_finished_run_drops_unreached_entries(tmp_path):
+	logs = []
+	for name in ("a", "b", "c"):
+		path = tmp_path / name
+		path.write_text(name)
+		logs.append(Log(str(path)))
+	cache_path = str(tmp_path / "cache.pkl")
+	run(cache_path, logs)
+
+	# a run that stops early keeps what it did not reach
+	run(cache_path, logs[:1], finished=False)
+	cache = ResultCache(cache_path)
+	assert len(cache.results) == 3 and len(cache.files) == 3
+
+	run(cache_path, logs[:1])
+	cache = ResultCache(cache_path)
+	assert list(cache.results.values()) == [logs[0].path]
+	assert list(cache.files) == [logs[0].path]
@@ -0,0 +1,109 @@
+import json
+import random
+from argparse import Namespace
+from functools import partial
+from os import listdir
+from os.path import join
+
+import chunked_json
+import test as statistics
+import train
+from features import capture_features, OBSERVED_PROTOCOL_FIELD
+from gen_dataset import generate
+from sketch import ApproxCounter, CountMinSketch, SpaceSaving
+
+def zipf_stream(n, keys, seed=1):
+	rng = random.Random(seed)
+	weights = [1 / (i + 1) ** 1.1 for i in range(keys)]
+	return rng.choices(["key{}".format(i) for i in range(keys)], weights, k=n)
+
+def exact_counts(stream):
+	counts = {}
+	for key in stream:
+		counts[key] = counts.get(key, 0) + 1
+	return counts
+
+def test_count_min_bound():
+	stream = zipf_stream(50000, 5000)
+	exact = exact_counts(stream)
+	sketch = CountMinSketch.from_error(0.001, 0.01)
+	for key in stream:
+		sketch.add(key)
+
+	over = [sketch.estimate(key) - count for key, count in exact.items()]
+	assert min(over) >= 0
+	# each key may miss the bound with probability delta
+	misses = sum(1 for error in over if error > 0.001 * sketch.total)
+	assert misses <= 0.01 * len(exact)
+
+def test_space_saving_recall():
+	stream = zipf_stream(50000, 5000)
+	exact = exact_counts(stream)
+	summary = SpaceSaving(100)
+	for key in stream:
+		summary.add(key)
+
+	# every key seen more than n / k times is guaranteed to be kept
+	for key, count in exact.items():
+		if count > len(stream) / 100:
+			assert key in summary.counts
+			assert summary.counts[key] >= count
+	true_top = {key for key, count in sorted(exact.items(), key=lambda v: -v[1])[:10]}
+	found = {key for key, count in summary.top(10)}
+	assert len(true_top & found) >= 9
+
+def test_merge_equals_single_pass():
+	stream = zipf_stream(20000, 2000)
+	single = ApproxCounter(200)
+	for key in stream:
+		single.add(key)
+
+	merged = ApproxCounter(200)
+	for i in range(4):
+		part = ApproxCounter(200)
+		for key in stream[i::4]:
+			part.add(key)
+		merged.merge(part)
+
+	assert merged.sketch.table == single.sketch.table
+	assert merged.sketch.total == single.sketch.total
+	exact = exact_counts(stream)
+	for key, count in sorted(exact.items(), key=lambda v: -v[1])[:20]:
+		assert count <= merged[key] <= count + 0.001 * len(stream)
+
+def write_capture(path, packets):
+	with open(path, 'w') as f:
+		json.dump([{"_index": "p", "_type": "doc", "_score": None, "_source": {"layers": layers}}
+				for layers in packets], f, indent=2)
+
+def test_from_file_matches_exact_in_process(tmp_path, monkeypatch):
+	# several chunks read in one process must not share one counter
+	path = str(tmp_path / "Wireshark.json")
+	write_capture(path, [{"eth": {"eth.src": "aa"}, "ip": {"ip.src": "10.0.0.{}".format(i % 7)}}
+			for i in range(196)])
+	monkeypatch.setattr(statistics, "map_chunks", partial(chunked_json.map_chunks, min_chunk=1024))
+
+	exact = statistics.WiresharkStatistics.from_file(path, 1)
+	approx = statistics.WiresharkStatistics.from_file(path, 1, ApproxCounter(50))
+	assert approx.instance_count == exact.instance_count == 196
+	for field, count in exact.field_count.items():
+		assert count <= approx.field_count[field] <= count + 0.001 * 2 * 196
+	assert approx.top(1) == [("aa@eth.src", 196)]
+
+def test_approx_training_streams_without_feature_cache(tmp_path):
+	data_root = str(tmp_path / "data")
+	generate(Namespace(output=data_root, persons=2, cases=1, size="64KB", seed=0))
+	capture = join(data_root, "case001", "Wireshark.json")
+
+	exact = capture_features(capture, cache=False).fields(OBSERVED_PROTOCOL_FIELD)
+	fields, layers = train.approx_capture_fields(capture, (10000, 0.001, 0.01))
+	assert set(fields) == {key for key in exact if '@' in key}
+	assert set(layers) == set(capture_features(capture, cache=False).layer_counts())
+	# a small k keeps at most k keys, the most frequent ones
+	fields, layers = train.approx_capture_fields(capture, (5, 0.001, 0.01))
+	assert len(fields) == 5
+
+	train.train(Namespace(file_path=data_root, output=str(tmp_path / "trained"), labels=None, workers=1,
+			min_support=1, determinism=0.0, deterministic=False, approx_k=50, epsilon=0.001, delta=0.01))
+	assert not any(name.endswith(".features") for name in listdir(join(data_root, "case001")))
+	assert listdir(join(str(tmp_path / "trained"), "field_value_dict"))
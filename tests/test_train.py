@@ -0,0 +1,59 @@
+import os
+from argparse import Namespace
+from os.path import join
+
+import pytest
+
+import model
+import train
+from gen_dataset import generate
+from predict import SecurityPredictor
+
+def xml_table(class_num):
+	return {"EventID": {"4624": {1: 3, class_num: 2}, "4688": {2: 1}},
+			"Task": {"12544": {class_num: 5}},
+			"ProcessID": {"4": {1: 1, 2: 1, 3: 1}, "1234": {3: 4}}}
+
+@pytest.mark.parametrize("class_num", [3, train.DENSE_LIMIT, train.DENSE_LIMIT + 1, 500])
+def test_xml_table_round_trip(tmp_path, class_num):
+	table = xml_table(class_num)
+	path = str(tmp_path / "Security.csv")
+	train.write_xml_table(path, table, class_num)
+	with open(path) as f:
+		header = f.readline().rstrip("\n").split(",")
+	# dense Person1..N columns only up to DENSE_LIMIT, like field_value_dict
+	assert len(header) == (class_num + 2 if class_num <= train.DENSE_LIMIT else 1)
+
+	predictor = SecurityPredictor()
+	predictor.load_csv(path)
+	assert predictor.class_num == class_num
+	assert predictor.table == {tag: {float(value): (counts, sum(counts.values())) for value, counts in values.items()}
+			for tag, values in table.items()}
+	assert predictor.compute(4624.0, "EventID") == [1, 0.6]
+	assert predictor.compute(12544.0, "Task") == [class_num, 1.0]
+
+def test_retraining_is_reproducible(tmp_path, monkeypatch):
+	data_root = str(tmp_path / "data")
+	generate(Namespace(output=data_root, persons=2, cases=1, size="16KB", seed=0))
+	outputs = []
+	for name in ("a", "b"):
+		outputs.append(str(tmp_path / name))
+		train.train(Namespace(file_path=data_root, output=outputs[-1], labels=None, workers=1,
+				min_support=1, determinism=0.0, deterministic=False, approx_k=None, epsilon=0.001, delta=0.01))
+
+	files = []
+	for root, dirs, names in os.walk(outputs[0]):
+		files += [os.path.relpath(join(root, name), outputs[0]) for name in names]
+	assert "field_value_dict.bin" in files
+	for name in files:
+		with open(join(outputs[0], name), 'rb') as a, open(join(outputs[1], name), 'rb') as b:
+			assert a.read() == b.read(), name
+
+	# the unstamped model is stamped on first use, not compiled again
+	def no_compile(directory, path, stamped=True):
+		raise AssertionError("trained model compiled again")
+	monkeypatch.setattr(model, "compile_model", no_compile)
+	tables = join(outputs[0], "field_value_dict")
+	compiled = model.open_model(tables, join(outputs[0], "field_value_dict.bin"))
+	assert compiled.stamp == model.source_stamp(tables)
+	compiled.close()
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from predict import timeline
+from window import SlidingCounter, windows, xml_events
+
+try:
+	import xml.etree.cElementTree as ET
+except ImportError:
+	import xml.etree.ElementTree as ET
+
+def recount(events, size, step):
+	# every aligned window holding an event, counted from scratch
+	starts = set()
+	for time, keys in events:
+		k = int(time // step)
+		while k * step + size > time:
+			starts.add(k * step)
+			k -= 1
+	res = {}
+	for start in sorted(starts):
+		counts = {}
+		for time, keys in events:
+			if start <= time < start + size:
+				for key in keys:
+					counts[key] = counts.get(key, 0) + 1
+		if counts:
+			res[start] = counts
+	return res
+
+def random_events(rng, n):
+	# quarter seconds keep the float window bounds exact; some gaps are longer
+	# than any window and some events carry no keys
+	events = []
+	time = rng.randrange(0, 400) / 4
+	for i in range(n):
+		time += rng.choice([0, 0.25, 0.5, 1, 1.75, 3]) if rng.random() < 0.9 else rng.randrange(20, 200) / 4
+		events.append((time, [rng.choice("abcde") for j in range(rng.randrange(3))]))
+	return events
+
+@pytest.mark.parametrize("size,step", [(1, None), (5, None), (2.5, None), (4, 1), (5, 2), (3, 0.75), (10, 2.5)])
+def test_windows_match_recount(size, step):
+	rng = random.Random(size * 100 + (step or 0))
+	for i in range(30):
+		events = random_events(rng, rng.randrange(1, 60))
+		got = {}
+		for start, end, counts in windows(events, size, step):
+			assert end == start + size and start not in got
+			got[start] = dict(counts)
+		assert got == recount(events, size, step or size)
+
+def test_gap_windows_are_skipped():
+	events = [(0, ["a"]), (1, ["b"]), (1000, ["a"]), (1000.5, ["a"])]
+	assert [(start, dict(counts)) for start, end, counts in windows(events, 2, 1)] == [
+			(-1, {"a": 1}), (0, {"a": 1, "b": 1}), (1, {"b": 1}), (999, {"a": 2}), (1000, {"a": 2})]
+
+def test_sliding_counter_evicts_to_zero():
+	counter = SlidingCounter()
+	counter.add(0, ["a", "b", "a"])
+	counter.add(1, ["b"])
+	counter.evict(1)
+	assert counter.counts == {"b": 1}
+	counter.evict(2)
+	assert counter.counts == {} and not counter.events
+
+class Recorder:
+	def predict_window(self, counts):
+		return dict(counts)
+
+@pytest.mark.parametrize("size,step", [(5, None), (6, 2)])
+def test_timeline_matches_recount(size, step):
+	events = random_events(random.Random(7), 200)
+	assert timeline(Recorder(), iter(events), size, step) == recount(events, size, step or size)
+
+EVENT = ('<Event xmlns="http://schemas.microsoft.com/win/2004/08/events/event"><System><EventID>{}</EventID>'
+		'<TimeCreated SystemTime="{}"/><Execution ProcessID="{}" ThreadID="1"/></System></Event>')
+
+def test_xml_events_in_time_order():
+	# the newest event comes first in an export
+	root = ET.fromstring("<Events>" + "".join(EVENT.format(*event) for event in [
+			(4624, "2020-06-01T08:00:09.5000000Z", 500),
+			(4688, "2020-06-01T08:00:03Z", 4),
+			(4624, "2020-06-01T08:00:00.2500000Z", 500)]) + "</Events>")
+	start = 1590998400
+	assert xml_events(root, "EventID") == [(start + 0.25, ["4624"]), (start + 3, ["4688"]), (start + 9.5, ["4624"])]
+	assert [values for time, values in xml_events(root, "Execution")] == [["500"], ["4"], ["500"]]
+	assert [(start - 1590998400, dict(counts)) for start, end, counts in windows(xml_events(root, "EventID"), 5)] == [
+			(0, {"4624": 1, "4688": 1}), (5, {"4624": 1})]
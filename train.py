@@ -0,0 +1,202 @@
+from argparse import ArgumentParser
+from os import listdir, makedirs, remove
+from os.path import isdir, join
+import multiprocessing as mp
+from test import DataLoader
+from features import capture_features, iter_capture, packet_fields, OBSERVED_PROTOCOL_FIELD
+from model import compile_model
+from sketch import ApproxCounter, ApproxTable, count
+
+# Builds field_value_dict/*.csv, field_value_dict.bin and the Security/Sysmon
+# tables from labelled test cases:
+#   python train.py DATA_ROOT -o trained [--labels labels.csv] [--deterministic]
+# predict.py --tables trained then uses them instead of the hand made ones.
+
+XML_TAGS = ["EventID", "Task", "ProcessID"]
+DENSE_LIMIT = 64
+
+def read_labels(path):
+	labels = {}
+	with open(path, 'r') as f:
+		for l in f:
+			arr = l.rstrip('\n').split(',')
+			if len(arr) >= 2 and arr[1].strip().isdigit():
+				labels[arr[0].strip()] = int(arr[1])
+	return labels
+
+def xml_counts(log, approx=None):
+	# approx: None for exact counts, else (k, epsilon, delta) of an ApproxCounter
+	counts = {tag: {} if approx is None else ApproxCounter(*approx) for tag in XML_TAGS}
+	if log is None:
+		return counts
+
+	def add(tag, value):
+		if value is not None:
+			count(counts[tag], value)
+
+	if log.type == "evtx":
+		for record in log.records():
+			for tag in XML_TAGS:
+				add(tag, record.get(tag))
+		return counts
+
+	log.load()
+	for elem in log.root:
+		xmlns = elem.tag.split("}")[0] + "}"
+	for res in log.root.iter(xmlns+"Execution"):
+		add("ProcessID", res.attrib.get('ProcessID'))
+	for tag in ("EventID", "Task"):
+		for res in log.root.iter(xmlns+tag):
+			add(tag, res.text)
+	log.root = None
+	return counts
+
+def approx_capture_fields(path, approx):
+	# streams the packets into one fixed size counter of the observed
+	# value@field keys, the exact feature cache would hold every value
+	observed = {field for fields in OBSERVED_PROTOCOL_FIELD.values() for field in fields}
+	counter = ApproxCounter(*approx)
+	layers = {}
+	for packet in iter_capture(path):
+		for layer in packet['_source']['layers']:
+			layers[layer] = None
+		for key in packet_fields(packet):
+			if key.rsplit('@', 1)[-1] in observed:
+				counter.add(key)
+	return counter.keys(), list(layers)
+
+def train_testcase(task):
+	# one labelled test case -> the fields it shows and its event counts
+	path, name, person, approx = task
+	testcase = DataLoader(path).load_testcase(name)
+	fields = []
+	layers = []
+	if testcase.wireshark_log is not None and approx is not None:
+		fields, layers = approx_capture_fields(testcase.wireshark_log.path, approx)
+	elif testcase.wireshark_log is not None:
+		features = capture_features(testcase.wireshark_log.path)
+		fields = [key for key in features.fields(OBSERVED_PROTOCOL_FIELD) if '@' in key]
+		layers = list(features.layer_counts())
+	return (person, name, fields, layers,
+			xml_counts(testcase.security_log, approx), xml_counts(testcase.sysmon_log, approx))
+
+def add_count(table, key, person, count=1):
+	if isinstance(table, ApproxTable):
+		table.add(key, person, count)
+		return
+	if key not in table:
+		table[key] = {}
+	table[key][person] = table[key].get(person, 0) + count
+
+def keep(counts, min_support, determinism):
+	total = sum(counts.values())
+	return total >= min_support and max(counts.values()) / total >= determinism
+
+def format_row(key, counts, class_num):
+	if class_num <= DENSE_LIMIT:
+		cells = [str(counts.get(i, 0)) for i in range(1, class_num+1)]
+	else:
+		cells = ["{}:{}".format(person, counts[person]) for person in sorted(counts)]
+	return ",".join([key] + cells + ([str(sum(counts.values()))] if class_num <= DENSE_LIMIT else []))
+
+def write_field_value_dict(directory, fields, layers, class_num):
+	if isdir(directory):
+		for csv in listdir(directory):
+			if csv.endswith(".csv"):
+				remove(join(directory, csv))
+	else:
+		makedirs(directory)
+
+	files = {"layers": sorted(layers.items())}
+	for key in sorted(fields):
+		if ',' in key or '\n' in key:
+			# not representable in the csv tables
+			continue
+		files.setdefault(key.rsplit('@', 1)[1], []).append((key, fields[key]))
+	for name, rows in files.items():
+		with open(join(directory, name + ".csv"), 'w') as f:
+			for key, counts in rows:
+				f.write(format_row(key, counts, class_num) + "\n")
+
+def write_xml_table(path, table, class_num):
+	# the statistics.xlsx block layout, one block per tag; above DENSE_LIMIT
+	# the header has no person columns and rows are person:count cells
+	with open(path, 'w') as f:
+		for tag in XML_TAGS:
+			header = [tag]
+			if class_num <= DENSE_LIMIT:
+				header += ["Person"+str(i) for i in range(1, class_num+1)] + ["Total"]
+			f.write(",".join(header) + "\n")
+			for value in sorted(table[tag], key=lambda v: (len(v), v)):
+				f.write(format_row(value, table[tag][value], class_num) + "\n")
+
+def train(args):
+	if args.labels:
+		labels = read_labels(args.labels)
+		names = sorted(labels)
+	else:
+		# like FileXmlStatistics, the n-th test case directory is person n
+		names = sorted(name for name in listdir(args.file_path) if isdir(join(args.file_path, name)))
+		labels = {name: num+1 for num, name in enumerate(names)}
+	approx = (args.approx_k, args.epsilon, args.delta) if args.approx_k else None
+	tasks = [(args.file_path, name, labels[name], approx) for name in names]
+
+	def table():
+		return {} if approx is None else ApproxTable(*approx)
+
+	fields = table()
+	layers = {}
+	xml = {"Security": {tag: table() for tag in XML_TAGS}, "Sysmon": {tag: table() for tag in XML_TAGS}}
+	class_num = max(labels.values()) if labels else 0
+
+	with mp.Pool(args.workers) as pool:
+		for person, name, testcase_fields, testcase_layers, security, sysmon in \
+				pool.imap(train_testcase, tasks):
+			print("testcase {}: person {}".format(name, person))
+			for key in testcase_fields:
+				add_count(fields, key, person)
+			for layer in testcase_layers:
+				add_count(layers, layer, person)
+			for log, counts in (("Security", security), ("Sysmon", sysmon)):
+				for tag in XML_TAGS:
+					for value, count in counts[tag].items():
+						add_count(xml[log][tag], value, person, count)
+
+	determinism = 1.0 if args.deterministic else args.determinism
+	fields = {key: counts for key, counts in fields.items() if keep(counts, args.min_support, determinism)}
+	for log in xml:
+		for tag in XML_TAGS:
+			xml[log][tag] = {value: counts for value, counts in xml[log][tag].items()
+					if keep(counts, args.min_support, determinism)}
+
+	makedirs(args.output, exist_ok=True)
+	write_field_value_dict(join(args.output, "field_value_dict"), fields, layers, class_num)
+	# unstamped, so retraining on the same data writes the same bytes; the
+	# first open_model checks the tables' checksum and stamps it
+	compile_model(join(args.output, "field_value_dict"), join(args.output, "field_value_dict.bin"), False)
+	for log in xml:
+		write_xml_table(join(args.output, log + ".csv"), xml[log], class_num)
+	print("{} fields, {} layers, {} persons written to {}".format(len(fields), len(layers), class_num, args.output))
+
+if __name__ == "__main__":
+
+	parser = ArgumentParser()
+	parser.add_argument("file_path", help="root path of labelled test cases")
+	parser.add_argument("-o", "--output", default="trained", help="directory for the trained tables")
+	parser.add_argument("--labels", help="csv of test case directory,person (default: directory order)")
+	parser.add_argument("--workers", type=int, default=mp.cpu_count(), help="test cases processed in parallel")
+	parser.add_argument("--min-support", type=int, default=1,
+			help="drop values seen fewer times than this")
+	parser.add_argument("--determinism", type=float, default=0.0,
+			help="drop values whose top person has a smaller share than this")
+	parser.add_argument("--deterministic", action="store_true",
+			help="only keep values seen for a single person (the README rule)")
+	parser.add_argument("--approx-k", type=int,
+			help="count with fixed size sketches, keeping the top k values per person")
+	parser.add_argument("--epsilon", type=float, default=0.001,
+			help="sketch count error bound, share of all counted values")
+	parser.add_argument("--delta", type=float, default=0.01,
+			help="probability of exceeding --epsilon")
+	args = parser.parse_args()
+
+	train(args)
@@ -0,0 +1,87 @@
+from collections import deque
+from datetime import datetime, timezone
+
+# Tumbling (step == size) and sliding (step < size) windows over timestamped
+# events. Every event is counted once when it enters and once when it is
+# evicted, so a whole log costs O(events) however many windows overlap.
+
+class SlidingCounter:
+	def __init__(self):
+		self.events = deque()
+		self.counts = {}
+
+	def add(self, time, keys):
+		self.events.append((time, keys))
+		for key in keys:
+			self.counts[key] = self.counts.get(key, 0) + 1
+
+	def evict(self, start):
+		while self.events and self.events[0][0] < start:
+			time, keys = self.events.popleft()
+			for key in keys:
+				if self.counts[key] == 1:
+					del self.counts[key]
+				else:
+					self.counts[key] -= 1
+
+def windows(events, size, step=None):
+	# events: (time, keys) in time order. Window starts are multiples of step so
+	# windows of different logs line up. The yielded counts dict is reused, use
+	# it before asking for the next window.
+	step = step or size
+
+	def first_start(time):
+		# earliest aligned window that still contains time
+		return ((time - size) // step + 1) * step
+
+	counter = SlidingCounter()
+	start = None
+	for time, keys in events:
+		if start is None:
+			start = first_start(time)
+		while time >= start + size:
+			if counter.counts:
+				yield start, start + size, counter.counts
+			start += step
+			counter.evict(start)
+			if not counter.events:
+				# skip the empty windows of a gap in one jump
+				start = max(start, first_start(time))
+		if time >= start:
+			counter.add(time, keys)
+	while counter.events:
+		if counter.counts:
+			yield start, start + size, counter.counts
+		start += step
+		counter.evict(start)
+
+def packet_time(packet):
+	frame = packet['_source']['layers'].get('frame', {})
+	if 'frame.time_epoch' in frame:
+		return float(frame['frame.time_epoch'])
+	return None
+
+def system_time(text):
+	# TimeCreated SystemTime, "2020-06-01T08:00:00.1234567Z"
+	text = text.rstrip('Z')
+	main, _, fraction = text.partition('.')
+	time = datetime.strptime(main, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+	return time.timestamp() + (float('0.' + fraction) if fraction else 0.0)
+
+def xml_events(root, tag):
+	# (time, values of tag) per event in time order, exports list the newest
+	# event first; Execution counts its ProcessID attribute
+	for elem in root:
+		xmlns = elem.tag.split("}")[0] + "}"
+	events = []
+	for event in root.iter(xmlns+"Event"):
+		created = event.find(xmlns+"System/"+xmlns+"TimeCreated")
+		if created is None:
+			continue
+		if tag == "Execution":
+			values = [res.attrib['ProcessID'] for res in event.iter(xmlns+tag)]
+		else:
+			values = [res.text for res in event.iter(xmlns+tag)]
+		events.append((system_time(created.attrib['SystemTime']), values))
+	events.sort(key=lambda event: event[0])
+	return events